@@ -1,8 +1,25 @@
+import blockio
 import heapq
+import instrumentation
+import numpy as np
 import os
-import requests
+import struct
 import time
 
+# Container layout: magic, original length, number of encoded bits, number of symbols,
+# then one (symbol, code length) byte pair per symbol and the packed bitstream
+HUFFMAN_MAGIC = b"HUF1"
+HUFFMAN_HEADER = struct.Struct(">4sQQH")
+
+# Block container layout: magic, block size, number of blocks, then the block index of
+# blockio followed by the blocks, each one a full Huffman container
+HUFFMAN_BLOCKS_MAGIC = b"HUFB"
+HUFFMAN_BLOCKS_HEADER = struct.Struct(">4sQI")
+
+# Longest code the compressors produce and the decoder accepts, a decode table for codes of
+# length L needs secondary tables of 2^(L - table_bits) entries
+MAX_CODE_LENGTH = 24
+
 class HuffmanNode:
     def __init__(self, char, frequency):
         self.char = char
@@ -22,6 +39,10 @@ def build_huffman_tree(text):
         else:
             frequency[char] = 1
 
+    return build_huffman_tree_from_frequencies(frequency)
+
+
+def build_huffman_tree_from_frequencies(frequency):
     priority_queue = []
     for char, freq in frequency.items():
         node = HuffmanNode(char, freq)
@@ -48,14 +69,11 @@ def build_huffman_codes(node, current_code="", huffman_codes={}):
 
 
 def encode_text(text, huffman_codes):
-    encoded_text = ""
-    for char in text:
-        encoded_text += huffman_codes[char]
+    encoded_text = "".join([huffman_codes[char] for char in text])
 
     # Add padding if necessary
-    extra_padding = 8 - len(encoded_text) % 8
-    if extra_padding != 8:
-        encoded_text += '0' * extra_padding
+    extra_padding = (8 - len(encoded_text) % 8) % 8
+    encoded_text += '0' * extra_padding
 
     # Store the padding information in the first byte
     padded_info = "{0:08b}".format(extra_padding)
@@ -85,7 +103,478 @@ def decode_text(encoded_text, huffman_tree):
     return decoded_text
 
 
+def build_code_lengths(huffman_tree, max_length=MAX_CODE_LENGTH):
+    # Collect the depth of every leaf, a single-symbol tree still needs a 1-bit code.
+    # While a code is longer than max_length, the frequencies are halved (rounding up so no
+    # symbol disappears) and the tree rebuilt, which flattens it a little each time.
+    if huffman_tree.char is not None:
+        return {huffman_tree.char: 1}
+
+    while True:
+        code_lengths = {}
+        frequency = {}
+        stack = [(huffman_tree, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node.char is not None:
+                code_lengths[node.char] = depth
+                frequency[node.char] = node.frequency
+            else:
+                stack.append((node.left, depth + 1))
+                stack.append((node.right, depth + 1))
+        if max(code_lengths.values()) <= max_length:
+            return code_lengths
+        huffman_tree = build_huffman_tree_from_frequencies(
+            {char: (freq + 1) // 2 for char, freq in sorted(frequency.items())})
+
+
+def build_canonical_codes(code_lengths):
+    # Assign codes in (length, symbol) order, each code is the previous one plus one,
+    # shifted left whenever the length grows. Returns symbol -> (code, length)
+    canonical_codes = {}
+    code = 0
+    previous_length = 0
+    for char, length in sorted(code_lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - previous_length
+        canonical_codes[char] = (code, length)
+        code += 1
+        previous_length = length
+    return canonical_codes
+
+
+def build_decode_table(code_lengths, table_bits=12):
+    # Primary table indexed by the next table_bits bits. Short codes fill every slot sharing
+    # their prefix with (char, length), long codes share a slot that points (None, (sub_bits, subtable))
+    # to a secondary table indexed by the bits following the primary ones.
+    canonical_codes = build_canonical_codes(code_lengths)
+    max_length = max(code_lengths.values())
+    table_bits = min(table_bits, max_length)
+
+    table = [None] * (1 << table_bits)
+    long_codes = {}
+    for char, (code, length) in canonical_codes.items():
+        if length <= table_bits:
+            start = code << (table_bits - length)
+            for index in range(start, start + (1 << (table_bits - length))):
+                table[index] = (char, length)
+        else:
+            prefix = code >> (length - table_bits)
+            long_codes.setdefault(prefix, []).append((char, code, length))
+
+    for prefix, entries in long_codes.items():
+        sub_bits = max(length for _, _, length in entries) - table_bits
+        subtable = [None] * (1 << sub_bits)
+        for char, code, length in entries:
+            suffix = code & ((1 << (length - table_bits)) - 1)
+            start = suffix << (table_bits + sub_bits - length)
+            for index in range(start, start + (1 << (table_bits + sub_bits - length))):
+                subtable[index] = (char, length)
+        table[prefix] = (None, (sub_bits, subtable))
+
+    return table, table_bits, max_length
+
+
+def build_multi_symbol_table(table, table_bits):
+    # For every primary index, decode as many whole codes as fit in table_bits bits so a
+    # single lookup yields several symbols. Slots whose first code is long keep their pointer.
+    table_mask = (1 << table_bits) - 1
+    multi_table = []
+    for index in range(1 << table_bits):
+        chars = []
+        consumed = 0
+        while True:
+            entry = table[(index << consumed) & table_mask]
+            if entry is None:   # Unused slot, only possible with a single-symbol code
+                break
+            char, length = entry
+            if char is None or consumed + length > table_bits:
+                break
+            chars.append(char)
+            consumed += length
+        if chars:
+            multi_table.append((tuple(chars), consumed))
+        else:
+            multi_table.append(table[index])
+    return multi_table
+
+
+def iter_decode_canonical(chunks, code_lengths, total_bits, table_bits=12):
+    # Decode directly from the packed bytes given as an iterable of chunks: keep an integer
+    # bit buffer holding at least max_length bits and resolve symbols with one lookup (two for
+    # long codes). The symbols decoded so far are yielded as a list whenever a chunk runs out.
+    table, table_bits, max_length = build_decode_table(code_lengths, table_bits)
+    multi_table = build_multi_symbol_table(table, table_bits)
+    table_mask = (1 << table_bits) - 1
+
+    # Refill several bytes at a time so the buffer is touched once per many symbols
+    refill_bytes = max_length // 8 + 8
+    refill_bits = refill_bytes * 8
+
+    chunks = iter(chunks)
+    byte_data = b""
+    decoded = []
+    append = decoded.append
+    extend = decoded.extend
+    bit_buffer = 0
+    bit_count = 0
+    position = 0
+    remaining = total_bits
+    while remaining > 0:
+        if bit_count < max_length:
+            chunk = bytes(byte_data[position:position + refill_bytes])
+            position += refill_bytes
+            if len(chunk) < refill_bytes:
+                next_chunk = next(chunks, None)
+                if next_chunk is not None:
+                    if decoded:
+                        yield decoded
+                        decoded = []
+                        append = decoded.append
+                        extend = decoded.extend
+                    byte_data = chunk + bytes(next_chunk)
+                    position = 0
+                    continue
+            bit_buffer = ((bit_buffer & ((1 << bit_count) - 1)) << refill_bits) | \
+                (int.from_bytes(chunk, "big") << (8 * (refill_bytes - len(chunk))))   # Past the end, read zeros
+            bit_count += refill_bits
+
+        peek = (bit_buffer >> (bit_count - table_bits)) & table_mask
+        if remaining >= table_bits:
+            chars, length = multi_table[peek]
+            if chars is not None:
+                extend(chars)
+                bit_count -= length
+                remaining -= length
+                continue
+        else:
+            # Near the end the zero padding must not be decoded, so go one symbol at a time
+            chars, length = table[peek]
+            if chars is not None:
+                append(chars)
+                bit_count -= length
+                remaining -= length
+                continue
+
+        sub_bits, subtable = length
+        char, length = subtable[(bit_buffer >> (bit_count - table_bits - sub_bits)) & ((1 << sub_bits) - 1)]
+        append(char)
+        bit_count -= length
+        remaining -= length
+
+    if decoded:
+        yield decoded
+
+
+def decode_canonical(byte_data, code_lengths, total_bits, table_bits=12):
+    decoded = []
+    for part in iter_decode_canonical((byte_data,), code_lengths, total_bits, table_bits):
+        decoded.extend(part)
+    return decoded
+
+
+def pack_codes(data, code_table, out, bit_buffer=0, bit_count=0):
+    # Append the code of every symbol to an integer accumulator and move whole bytes
+    # into out, returns the leftover (bit_buffer, bit_count) so packing can be resumed
+    for symbol in data:
+        code, length = code_table[symbol]
+        bit_buffer = (bit_buffer << length) | code
+        bit_count += length
+        if bit_count >= 64:
+            bit_count -= 64
+            out += (bit_buffer >> bit_count).to_bytes(8, "big")
+            bit_buffer &= (1 << bit_count) - 1
+    return bit_buffer, bit_count
+
+
+def flush_bits(out, bit_buffer, bit_count):
+    # Write the remaining bits, padded with zeros up to the next byte boundary
+    if bit_count > 0:
+        num_bytes = (bit_count + 7) // 8
+        out += (bit_buffer << (num_bytes * 8 - bit_count)).to_bytes(num_bytes, "big")
+
+
+def write_huffman_header(out, original_length, total_bits, code_lengths):
+    out += HUFFMAN_HEADER.pack(HUFFMAN_MAGIC, original_length, total_bits, len(code_lengths))
+    for symbol in sorted(code_lengths):
+        out.append(symbol)
+        out.append(code_lengths[symbol])
+
+
+def read_huffman_header(byte_data):
+    # Returns (original_length, total_bits, code_lengths, offset of the bitstream)
+    magic, original_length, total_bits, num_symbols = HUFFMAN_HEADER.unpack_from(byte_data, 0)
+    if magic != HUFFMAN_MAGIC:
+        raise ValueError("Not a Huffman container")
+    offset = HUFFMAN_HEADER.size
+    code_lengths = {}
+    for _ in range(num_symbols):
+        code_lengths[byte_data[offset]] = byte_data[offset + 1]
+        if not 1 <= byte_data[offset + 1] <= MAX_CODE_LENGTH:
+            raise ValueError("Invalid Huffman code length")
+        offset += 2
+    return original_length, total_bits, code_lengths, offset
+
+
+def huffman_compress_bytes(data):
+    # Compress bytes into a self-describing container, only the code lengths are stored
+    out = bytearray()
+    if not data:
+        write_huffman_header(out, 0, 0, {})
+        return bytes(out)
+
+    # Symbols are pushed in ascending order so the tree does not depend on which
+    # engine counted the frequencies
+    frequency = {}
+    for symbol in data:
+        frequency[symbol] = frequency.get(symbol, 0) + 1
+    code_lengths = build_code_lengths(build_huffman_tree_from_frequencies(dict(sorted(frequency.items()))))
+    code_table = [None] * 256
+    for symbol, (code, length) in build_canonical_codes(code_lengths).items():
+        code_table[symbol] = (code, length)
+
+    write_huffman_header(out, len(data), 0, code_lengths)
+    header_size = len(out)
+    bit_buffer, bit_count = pack_codes(data, code_table, out)
+    total_bits = (len(out) - header_size) * 8 + bit_count
+    flush_bits(out, bit_buffer, bit_count)
+
+    # The bit count is only known once everything is packed
+    HUFFMAN_HEADER.pack_into(out, 0, HUFFMAN_MAGIC, len(data), total_bits, len(code_lengths))
+    return bytes(out)
+
+
+def pack_codes_numpy(symbols, code_values, code_lengths, out, bit_buffer=0, bit_count=0, chunk_size=1 << 20):
+    # Vectorized equivalent of pack_codes, resumable in the same way. The bit offset of every code
+    # comes from a cumsum of the code lengths, and each code is shifted into the 64-bit output word
+    # holding its last bit (leading bits crossing back into the previous word are kept apart).
+    # Codes never share bits, so every code landing in the same word can be merged with one
+    # bitwise_or.reduceat.
+    carry_word = np.uint64(bit_buffer << (64 - bit_count))
+    carry_bits = bit_count
+    for start in range(0, len(symbols), chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        values = code_values[chunk]
+        lengths = code_lengths[chunk].astype(np.int64)
+        ends = np.cumsum(lengths) + carry_bits
+        total_bits = int(ends[-1])
+        shifts = 64 - (ends & 63)                  # Left shift placing the code's last bit in its word
+        shifts[shifts == 64] = 0
+        word_index = (ends - 1) >> 6                # Word holding the last bit of the code
+        crosses = (ends - lengths) >> 6 != word_index
+
+        # Bits in the word of the last bit, and for codes crossing a boundary, the leading bits
+        # that spill back into the previous word
+        tail_words = values << shifts.astype(np.uint64)
+        head_words = np.zeros(len(chunk), dtype=np.uint64)
+        head_words[crosses] = values[crosses] >> (64 - shifts[crosses]).astype(np.uint64)
+
+        words = np.zeros(total_bits // 64 + 2, dtype=np.uint64)
+        words[0] = carry_word
+        first = np.flatnonzero(np.concatenate(([True], word_index[1:] != word_index[:-1])))
+        words[word_index[first]] |= np.bitwise_or.reduceat(tail_words, first)
+        words[word_index[crosses] - 1] |= head_words[crosses]
+
+        out += words[:total_bits // 64].astype(">u8").tobytes()
+        carry_word = words[total_bits // 64]
+        carry_bits = total_bits % 64
+
+    return int(carry_word) >> (64 - carry_bits), carry_bits
+
+
+def huffman_compress_numpy(data, stats=None):
+    # Same container and bitstream as huffman_compress_bytes, built without a per-symbol Python loop
+    if stats is None:
+        stats = instrumentation.NULL_STATS
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    if len(symbols) == 0:
+        return huffman_compress_bytes(data)
+
+    with stats.timer("count"):
+        counts = np.bincount(symbols, minlength=256)
+    with stats.timer("build_codes"):
+        frequency = {int(symbol): int(counts[symbol]) for symbol in np.flatnonzero(counts)}
+        code_lengths = build_code_lengths(build_huffman_tree_from_frequencies(frequency))
+    if stats is not instrumentation.NULL_STATS:
+        # Number of symbols per code length
+        stats.set("code_lengths", {length: list(code_lengths.values()).count(length)
+                                   for length in sorted(set(code_lengths.values()))})
+    code_values, code_value_lengths = build_numpy_code_table(code_lengths)
+    total_bits = int(np.dot(counts, code_value_lengths.astype(np.int64)))
+
+    stats.set("total_bits", total_bits)
+
+    out = bytearray()
+    write_huffman_header(out, len(symbols), total_bits, code_lengths)
+    with stats.timer("pack"):
+        flush_bits(out, *pack_codes_numpy(symbols, code_values, code_value_lengths, out))
+    return bytes(out)
+
+
+def build_numpy_code_table(code_lengths):
+    code_values = np.zeros(256, dtype=np.uint64)
+    code_value_lengths = np.zeros(256, dtype=np.uint8)
+    for symbol, (code, length) in build_canonical_codes(code_lengths).items():
+        code_values[symbol] = code
+        code_value_lengths[symbol] = length
+    return code_values, code_value_lengths
+
+
+def iter_chunks(inp, chunk_size):
+    # Accept either a binary file object or an iterable of byte chunks
+    if hasattr(inp, "read"):
+        return iter(lambda: inp.read(chunk_size), b"")
+    return iter(inp)
+
+
+def huffman_compress_stream(inp, out, chunk_size=1 << 20):
+    # Compress a binary file object (or an iterable of byte chunks) into out, holding at most
+    # one chunk in memory. A seekable input is read twice: once to count the frequencies and
+    # once to encode, producing a single container. Other inputs are compressed chunk by chunk
+    # into a sequence of containers, each one with its own code table.
+    if not (hasattr(inp, "seekable") and inp.seekable()):
+        for chunk in iter_chunks(inp, chunk_size):
+            if chunk:
+                out.write(huffman_compress_numpy(chunk))
+        return
+
+    start_position = inp.tell()
+    counts = np.zeros(256, dtype=np.int64)
+    for chunk in iter_chunks(inp, chunk_size):
+        counts += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+    inp.seek(start_position)
+
+    original_length = int(counts.sum())
+    header = bytearray()
+    if original_length == 0:
+        write_huffman_header(header, 0, 0, {})
+        out.write(header)
+        return
+
+    frequency = {int(symbol): int(counts[symbol]) for symbol in np.flatnonzero(counts)}
+    code_lengths = build_code_lengths(build_huffman_tree_from_frequencies(frequency))
+    code_values, code_value_lengths = build_numpy_code_table(code_lengths)
+    total_bits = int(np.dot(counts, code_value_lengths.astype(np.int64)))
+    write_huffman_header(header, original_length, total_bits, code_lengths)
+    out.write(header)
+
+    bit_buffer, bit_count = 0, 0
+    for chunk in iter_chunks(inp, chunk_size):
+        packed = bytearray()
+        bit_buffer, bit_count = pack_codes_numpy(np.frombuffer(chunk, dtype=np.uint8), code_values,
+                                                 code_value_lengths, packed, bit_buffer, bit_count)
+        out.write(packed)
+    packed = bytearray()
+    flush_bits(packed, bit_buffer, bit_count)
+    out.write(packed)
+
+
+def huffman_decompress_stream(inp, out, chunk_size=1 << 20):
+    # Decompress one or more consecutive containers from a binary file object, reading and
+    # writing at most about one chunk at a time
+    while True:
+        header = inp.read(HUFFMAN_HEADER.size)
+        if not header:
+            break
+        num_symbols = HUFFMAN_HEADER.unpack(header)[3]
+        header += inp.read(2 * num_symbols)
+        original_length, total_bits, code_lengths, _ = read_huffman_header(header)
+        if original_length == 0:
+            continue
+
+        def compressed_chunks(remaining=(total_bits + 7) // 8):
+            while remaining > 0:
+                chunk = inp.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise ValueError("Truncated Huffman container")
+                remaining -= len(chunk)
+                yield chunk
+
+        written = 0
+        for part in iter_decode_canonical(compressed_chunks(), code_lengths, total_bits):
+            out.write(bytes(part))
+            written += len(part)
+        if written != original_length:
+            raise ValueError("Corrupted Huffman container")
+
+
+def huffman_decompress_bytes(byte_data):
+    # Decode every container of byte_data, huffman_compress_stream writes several of them
+    # back to back when its input cannot be read twice
+    parts = []
+    position = 0
+    while position < len(byte_data):
+        original_length, total_bits, code_lengths, offset = read_huffman_header(memoryview(byte_data)[position:])
+        end = position + offset + (total_bits + 7) // 8
+        if end > len(byte_data):
+            raise ValueError("Truncated Huffman container")
+        if original_length > 0:
+            decoded = bytes(decode_canonical(memoryview(byte_data)[position + offset:end], code_lengths, total_bits))
+            if len(decoded) != original_length:
+                raise ValueError("Corrupted Huffman container")
+            parts.append(decoded)
+        position = end
+    return b"".join(parts)
+
+
+def huffman_compress_blocks(data, block_size=1 << 20, workers=None):
+    # Split the input into fixed-size blocks, each one gets its own code table
+    # and is compressed independently in a separate process
+    blocks = blockio.split_blocks(data, block_size)
+    compressed_blocks = blockio.run_blocks(huffman_compress_numpy, blocks, workers)
+
+    out = bytearray(HUFFMAN_BLOCKS_HEADER.pack(HUFFMAN_BLOCKS_MAGIC, block_size, len(blocks)))
+    blockio.write_block_index(out, blocks, compressed_blocks)
+    return bytes(out)
+
+
+def read_block_index(byte_data):
+    # Returns a list of (offset, compressed length, original length), one per block
+    magic, block_size, num_blocks = HUFFMAN_BLOCKS_HEADER.unpack_from(byte_data, 0)
+    if magic != HUFFMAN_BLOCKS_MAGIC:
+        raise ValueError("Not a Huffman block container")
+    return blockio.read_block_index(byte_data, HUFFMAN_BLOCKS_HEADER.size, num_blocks)
+
+
+def huffman_decompress_block(byte_data, block_number):
+    # Decode a single block without touching the others
+    offset, compressed_length, original_length = read_block_index(byte_data)[block_number]
+    return huffman_decompress_bytes(bytes(byte_data[offset:offset + compressed_length]))
+
+
+def huffman_decompress_blocks(byte_data, workers=None):
+    blocks = [bytes(byte_data[offset:offset + compressed_length])
+              for offset, compressed_length, _ in read_block_index(byte_data)]
+    return b"".join(blockio.run_blocks(huffman_decompress_bytes, blocks, workers))
+
+
+def huffman_compress_file(input_file, output_file, block_size=None, workers=None):
+    # With a block size the input is compressed block by block across a process pool
+    with open(input_file, 'rb') as file:
+        data = file.read()
+
+    if block_size is None:
+        compressed = huffman_compress_numpy(data)
+    else:
+        compressed = huffman_compress_blocks(data, block_size, workers)
+
+    with open(output_file, 'wb') as file:
+        file.write(compressed)
+
+
+def huffman_decompress_file(compressed_file, decompressed_file, workers=None):
+    # Everything needed for decoding is in the compressed file itself. A block container is
+    # decoded in parallel, anything else is streamed, whatever the number of containers.
+    with open(compressed_file, 'rb') as inp, open(decompressed_file, 'wb') as out:
+        if inp.read(4) == HUFFMAN_BLOCKS_MAGIC:
+            inp.seek(0)
+            out.write(huffman_decompress_blocks(inp.read(), workers))
+        else:
+            inp.seek(0)
+            huffman_decompress_stream(inp, out)
+
+
 def huffman_compress(input_file, output_file):
+    import requests  # Only needed to download the input, kept out of the module import
     response = requests.get(input_file)
     text = response.text
 
@@ -121,7 +610,41 @@ def huffman_decompress(compressed_file, decompressed_file, huffman_tree):
         file.write(decoded_text)
 
 
+def canonical_huffman_compress(input_file, output_file):
+    import requests
+    response = requests.get(input_file)
+    text = response.text
+
+    huffman_tree = build_huffman_tree(text)
+    code_lengths = build_code_lengths(huffman_tree)
+    huffman_codes = {char: format(code, "0%db" % length)
+                     for char, (code, length) in build_canonical_codes(code_lengths).items()}
+    encoded_bytes = encode_text(text, huffman_codes)
+
+    with open(output_file, 'wb') as file:
+        file.write(bytes(encoded_bytes))
+
+    # Only the code lengths are needed to rebuild the canonical codes
+    return code_lengths
+
+
+def canonical_huffman_decompress(compressed_file, decompressed_file, code_lengths):
+    with open(compressed_file, 'rb') as file:
+        byte_data = file.read()
+
+    # Same layout as huffman_compress: padding byte followed by the packed bits
+    extra_padding = byte_data[0]
+    total_bits = (len(byte_data) - 1) * 8 - extra_padding
+
+    decoded_text = "".join(decode_canonical(memoryview(byte_data)[1:], code_lengths, total_bits))
+
+    with open(decompressed_file, 'w', encoding="utf-8") as file:
+        file.write(decoded_text)
+
+
 if __name__ == '__main__':
+    import requests
+
     input_file = 'https://raw.githubusercontent.com/kzjeef/algs4/master/burrows-wheelers/testfile/dickens.txt'
     compressed_file = "Huffman_compressed.txt"
     decompressed_file = "Huffman_decompressed.txt"
@@ -133,4 +656,34 @@ if __name__ == '__main__':
 
     decompress_start_time = time.time()
     huffman_decompress(compressed_file, decompressed_file, huffman_tree)
-    print("---decompress %s seconds ---" % (time.time() - decompress_start_time))
\ No newline at end of file
+    print("---decompress %s seconds ---" % (time.time() - decompress_start_time))
+
+    compress_start_time = time.time()
+    code_lengths = canonical_huffman_compress(input_file, compressed_file)
+    print("---canonical compress %s seconds ---" % (time.time() - compress_start_time))
+
+    decompress_start_time = time.time()
+    canonical_huffman_decompress(compressed_file, decompressed_file, code_lengths)
+    print("---canonical decompress %s seconds ---" % (time.time() - decompress_start_time))
+
+    # Self-describing container, no tree is handed from the compressor to the decompressor
+    text_file = "Huffman_input.txt"
+    container_file = "Huffman_compressed.huf"
+    with open(text_file, 'wb') as file:
+        file.write(requests.get(input_file).content)
+
+    compress_start_time = time.time()
+    huffman_compress_file(text_file, container_file)
+    print("---container compress %s seconds ---" % (time.time() - compress_start_time))
+
+    decompress_start_time = time.time()
+    huffman_decompress_file(container_file, decompressed_file)
+    print("---container decompress %s seconds ---" % (time.time() - decompress_start_time))
+
+    compress_start_time = time.time()
+    huffman_compress_file(text_file, container_file, block_size=1 << 20)
+    print("---block compress %s seconds ---" % (time.time() - compress_start_time))
+
+    decompress_start_time = time.time()
+    huffman_decompress_file(container_file, decompressed_file)
+    print("---block decompress %s seconds ---" % (time.time() - decompress_start_time))
\ No newline at end of file
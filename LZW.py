@@ -1,6 +1,26 @@
-import requests
+from array import array
+import bitio
+import instrumentation
+import io
+import struct
 import time
 
+# Binary format: magic, maximum code width, full-dictionary policy and original length, then the
+# codes packed MSB first with a width growing from 9 bits up to the maximum. Codes 0-255 are the
+# single bytes, so the decoder can rebuild the initial alphabet on its own.
+LZW_MAGIC = b"LZW1"
+LZW_HEADER = struct.Struct(">4sBBQ")
+CLEAR_CODE = 256
+END_CODE = 257
+FIRST_CODE = 258
+MIN_CODE_BITS = 9
+# Widest codes accepted, the decoder's tables hold 2^max_bits entries
+MAX_CODE_BITS = 24
+
+# What happens once all 2^max_bits codes are used: keep the dictionary as it is,
+# or emit CLEAR_CODE and start again from the initial alphabet
+FULL_POLICIES = {"freeze": 0, "reset": 1}
+
 
 def lzw_compress(text):
     dictionary = {}
@@ -51,7 +71,192 @@ def lzw_decompress(compressed, dictionary):
     return result
 
 
+def code_width(next_code, max_bits):
+    # Number of bits used for a code while the encoder's next free code is next_code
+    return min(max_bits, max(MIN_CODE_BITS, next_code.bit_length()))
+
+
+def check_max_bits(max_bits):
+    # Codes narrower than MIN_CODE_BITS cannot hold CLEAR_CODE and END_CODE
+    if not MIN_CODE_BITS <= max_bits <= MAX_CODE_BITS:
+        raise ValueError("max_bits must be between %d and %d" % (MIN_CODE_BITS, MAX_CODE_BITS))
+
+
+def lzw_compress_bytes(data, max_bits=16, full_policy="freeze", stats=None):
+    # The dictionary is a trie stored flat: (prefix code << 8) | next byte -> code,
+    # so extending the current phrase costs one integer key lookup
+    check_max_bits(max_bits)
+    if full_policy not in FULL_POLICIES:
+        raise ValueError("Unknown full dictionary policy: %s" % full_policy)
+    reset_when_full = full_policy == "reset"
+    if stats is None:
+        stats = instrumentation.NULL_STATS
+    dictionary = {}
+    next_code = FIRST_CODE
+    max_codes = 1 << max_bits
+
+    out = io.BytesIO()
+    out.write(LZW_HEADER.pack(LZW_MAGIC, max_bits, FULL_POLICIES[full_policy], len(data)))
+    writer = bitio.BitWriter(out)
+    write_bits = writer.write_bits
+    with stats.timer("compress"):
+        phrase_code = -1
+        for symbol in data:
+            if phrase_code < 0:
+                phrase_code = symbol
+                continue
+            key = (phrase_code << 8) | symbol
+            code = dictionary.get(key)
+            if code is not None:
+                phrase_code = code
+                continue
+
+            write_bits(phrase_code, code_width(next_code, max_bits))
+
+            if next_code < max_codes:
+                dictionary[key] = next_code
+                next_code += 1
+                if next_code & (next_code - 1) == 0:
+                    # Dictionary size over time: one entry each time the codes get a bit wider
+                    # or the dictionary fills up, and the final size below
+                    stats.append("dictionary_size", next_code - FIRST_CODE)
+                    if next_code == max_codes and reset_when_full:
+                        stats.count("resets")
+                        write_bits(CLEAR_CODE, max_bits)
+                        dictionary.clear()
+                        next_code = FIRST_CODE
+            phrase_code = symbol
+
+        # The decoder adds an entry for every code after the first one, the end code
+        # is written with the width it will expect at that point
+        if phrase_code >= 0:
+            write_bits(phrase_code, code_width(next_code, max_bits))
+            next_code = min(next_code + 1, max_codes)
+        write_bits(END_CODE, code_width(next_code, max_bits))
+        writer.align()
+        writer.flush()
+    stats.append("dictionary_size", len(dictionary))
+    stats.set("final_code_width", code_width(next_code, max_bits))
+    return out.getvalue()
+
+
+def iter_lzw_decompress(byte_data, chunk_size=1 << 20):
+    # Only the file is needed: the alphabet is implicit and entries are rebuilt from the codes.
+    # Entry c is entry prefixes[c] followed by the byte suffixes[c], it is lengths[c] bytes long
+    # and starts with firsts[c], so memory depends on max_bits and not on the output size.
+    # Decoded bytes are yielded in chunks of about chunk_size. offsets[c] remembers where entry c
+    # was last seen in the output, while that is still in the buffer the entry is copied from there.
+    magic, max_bits, policy, original_length = LZW_HEADER.unpack_from(byte_data, 0)
+    if magic != LZW_MAGIC:
+        raise ValueError("Not an LZW file")
+    check_max_bits(max_bits)
+    max_codes = 1 << max_bits
+
+    # Every code after the first adds one entry, so a short file never needs all of max_codes
+    num_entries = min(max_codes, FIRST_CODE + (len(byte_data) - LZW_HEADER.size) * 8 // MIN_CODE_BITS + 1)
+    prefixes = array('i', [-1]) * num_entries
+    suffixes = bytearray(num_entries)
+    firsts = bytearray(num_entries)
+    lengths = array('I', [1]) * num_entries
+    offsets = array('q', [-1]) * num_entries
+    suffixes[:256] = firsts[:256] = bytes(range(256))
+
+    out = bytearray()
+    out_start = 0   # Output position of out[0]
+    dict_size = FIRST_CODE
+    previous = -1
+    reader = bitio.BitReader(io.BytesIO(byte_data[LZW_HEADER.size:]))
+    read_bits = reader.read_bits
+    while True:
+        # The encoder is always one entry ahead once a first code has been read
+        next_code = dict_size if previous < 0 else min(dict_size + 1, max_codes)
+        try:
+            code = read_bits(code_width(next_code, max_bits))
+        except EOFError:
+            raise ValueError("Truncated LZW file")
+
+        if code == END_CODE:
+            break
+        if code == CLEAR_CODE:
+            dict_size = FIRST_CODE
+            previous = -1
+            continue
+
+        if previous >= 0 and dict_size < max_codes:
+            if code > dict_size:
+                raise ValueError("Invalid LZW code")
+            # When code is the entry being defined, its first byte is the previous entry's
+            prefixes[dict_size] = previous
+            suffixes[dict_size] = firsts[code] if code < dict_size else firsts[previous]
+            firsts[dict_size] = firsts[previous]
+            lengths[dict_size] = lengths[previous] + 1
+            offsets[dict_size] = offsets[previous]  # The previous entry is followed by this one's first byte
+            dict_size += 1
+        elif code >= dict_size:
+            raise ValueError("Invalid LZW code")
+
+        length = lengths[code]
+        start = offsets[code] - out_start
+        offsets[code] = out_start + len(out)
+        if start >= 0:
+            end = start + length
+            if end > len(out):
+                # Entry defined by this very code: the previous entry plus its own first byte
+                out += out[start:]
+                out.append(out[start])
+            else:
+                out += out[start:end]
+        else:
+            # Walk the prefix chain, writing the entry backwards into the space reserved for it
+            index = len(out) + length
+            out += bytes(length)
+            entry_code = code
+            while entry_code >= 0:
+                index -= 1
+                out[index] = suffixes[entry_code]
+                entry_code = prefixes[entry_code]
+        previous = code
+
+        if len(out) >= chunk_size:
+            yield bytes(out)
+            out_start += len(out)
+            out.clear()
+
+    if out:
+        yield bytes(out)
+
+
+def lzw_decompress_bytes(byte_data):
+    original_length = LZW_HEADER.unpack_from(byte_data, 0)[3]
+    result = bytearray()
+    for chunk in iter_lzw_decompress(byte_data):
+        result += chunk
+    if len(result) != original_length:
+        raise ValueError("Corrupted LZW file")
+    return bytes(result)
+
+
+def lzw_compress_file(input_file, output_file, max_bits=16, full_policy="freeze"):
+    with open(input_file, 'rb') as file:
+        data = file.read()
+
+    with open(output_file, 'wb') as file:
+        file.write(lzw_compress_bytes(data, max_bits, full_policy))
+
+
+def lzw_decompress_file(compressed_file, decompressed_file):
+    with open(compressed_file, 'rb') as file:
+        byte_data = file.read()
+
+    with open(decompressed_file, 'wb') as file:
+        for chunk in iter_lzw_decompress(byte_data):
+            file.write(chunk)
+
+
 if __name__ == '__main__':
+    # The demo downloads its input, the codec itself does not need requests
+    import requests
+
     #text = "TOBEORNOTTOBEORTOBEORNOT"
     input_file = 'https://raw.githubusercontent.com/kzjeef/algs4/master/burrows-wheelers/testfile/dickens.txt'
     response = requests.get(input_file)
@@ -68,3 +273,15 @@ if __name__ == '__main__':
     with open("LZW_decompressed.txt", 'w', encoding="utf-8") as file:
         file.write(decompressed_text)
     print("---decompress %s seconds ---" % (time.time() - decompress_start_time))
+
+    # Binary format, decompressed from the file alone
+    with open("LZW_input.txt", 'wb') as file:
+        file.write(response.content)
+
+    compress_start_time = time.time()
+    lzw_compress_file("LZW_input.txt", "LZW_compressed.lzw")
+    print("---binary compress %s seconds ---" % (time.time() - compress_start_time))
+
+    decompress_start_time = time.time()
+    lzw_decompress_file("LZW_compressed.lzw", "LZW_decompressed.txt")
+    print("---binary decompress %s seconds ---" % (time.time() - decompress_start_time))
@@ -1,6 +1,13 @@
-import requests
+import instrumentation
+import numpy as np
+import struct
 import time
 
+# Binary format: magic, original length and number of runs, then one byte per run
+# followed by all run lengths as LEB128 varints (7 bits per byte, high bit set on all but the last)
+RLE_MAGIC = b"RLE1"
+RLE_HEADER = struct.Struct(">4sQQ")
+
 
 def run_length_encode(data):
     """Encodes the input data using Run-Length Encoding and returns two lists: characters and their frequencies."""
@@ -47,14 +54,108 @@ def run_length_decode(chars, frequency_string):
             decoded.append(chars[i] * int(frequency_string[frequency_index]))
             frequency_index += 1
         else:
-            frequency_index += 1
-            decoded.append(chars[i] * int(frequency_string[frequency_index] + frequency_string[frequency_index + 1]))
-            frequency_index += 3
+            # Multi-digit frequencies are enclosed in commas
+            closing_index = frequency_string.index(',', frequency_index + 1)
+            decoded.append(chars[i] * int(frequency_string[frequency_index + 1:closing_index]))
+            frequency_index = closing_index + 1
 
     return ''.join(decoded)
 
 
+def find_runs(data):
+    """Returns the byte value and the length of every run, found from the positions where consecutive bytes differ."""
+    values = np.frombuffer(data, dtype=np.uint8)
+    if len(values) == 0:
+        return values, np.zeros(0, dtype=np.uint64)
+
+    run_ends = np.append(np.flatnonzero(np.diff(values)) + 1, len(values))
+    run_lengths = np.diff(run_ends, prepend=0).astype(np.uint64)
+    return values[run_ends - 1], run_lengths
+
+
+def encode_varints(numbers):
+    """Encodes an array of non-negative integers as consecutive LEB128 varints."""
+    num_bytes = np.ones(len(numbers), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        num_bytes += numbers >= np.uint64(1 << shift)
+
+    offsets = np.cumsum(num_bytes) - num_bytes
+    encoded = np.zeros(int(num_bytes.sum()), dtype=np.uint8)
+    for byte_index in range(int(num_bytes.max(initial=0))):
+        selected = num_bytes > byte_index
+        groups = (numbers[selected] >> np.uint64(7 * byte_index)) & np.uint64(0x7F)
+        continued = (num_bytes[selected] > byte_index + 1).astype(np.uint64) << np.uint64(7)
+        encoded[offsets[selected] + byte_index] = groups | continued
+    return encoded.tobytes()
+
+
+def decode_varints(data):
+    """Decodes consecutive LEB128 varints back into an array of integers."""
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    if len(encoded) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if encoded[-1] & 0x80:
+        raise ValueError("Truncated varint")
+
+    ends = np.flatnonzero(encoded < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    byte_index = np.arange(len(encoded)) - np.repeat(starts, ends - starts + 1)
+    groups = (encoded & 0x7F).astype(np.uint64) << (7 * byte_index).astype(np.uint64)
+    return np.add.reduceat(groups, starts)
+
+
+def rle_compress_bytes(data, stats=None):
+    """Encodes bytes into the binary RLE format, with no limit on the run length."""
+    if stats is None:
+        stats = instrumentation.NULL_STATS
+    with stats.timer("find_runs"):
+        symbols, run_lengths = find_runs(data)
+    with stats.timer("encode_varints"):
+        varints = encode_varints(run_lengths)
+    stats.count("runs", len(symbols))
+    if stats is not instrumentation.NULL_STATS:
+        stats.set("longest_run", int(run_lengths.max()) if len(run_lengths) else 0)
+    header = RLE_HEADER.pack(RLE_MAGIC, len(data), len(symbols))
+    return header + symbols.tobytes() + varints
+
+
+def rle_decompress_bytes(byte_data):
+    """Decodes the binary RLE format back to the original bytes."""
+    magic, original_length, num_runs = RLE_HEADER.unpack_from(byte_data, 0)
+    if magic != RLE_MAGIC:
+        raise ValueError("Not an RLE file")
+
+    symbols_end = RLE_HEADER.size + num_runs
+    symbols = np.frombuffer(byte_data, dtype=np.uint8, count=num_runs, offset=RLE_HEADER.size)
+    run_lengths = decode_varints(byte_data[symbols_end:])
+    if len(run_lengths) != num_runs or int(run_lengths.sum()) != original_length:
+        raise ValueError("Corrupted RLE file")
+
+    return np.repeat(symbols, run_lengths.astype(np.int64)).tobytes()
+
+
+def rle_compress_file(input_file, output_file):
+    """Compresses a file into the binary RLE format."""
+    with open(input_file, 'rb') as file:
+        data = file.read()
+
+    with open(output_file, 'wb') as file:
+        file.write(rle_compress_bytes(data))
+
+
+def rle_decompress_file(compressed_file, decompressed_file):
+    """Decompresses a binary RLE file."""
+    with open(compressed_file, 'rb') as file:
+        byte_data = file.read()
+
+    with open(decompressed_file, 'wb') as file:
+        file.write(rle_decompress_bytes(byte_data))
+
+
 if __name__ == '__main__':
+    # The demo downloads its input, the codec itself does not need requests
+    import requests
+
     input_file_url = 'https://raw.githubusercontent.com/kzjeef/algs4/master/burrows-wheelers/testfile/dickens.txt'
     response = requests.get(input_file_url)
 
@@ -92,3 +193,15 @@ if __name__ == '__main__':
             file.write(decompressed_data)
 
         print("---decompress %s seconds ---" % (time.time() - decompress_start_time))
+
+        # Binary format with varint run lengths in a single file
+        with open("RLE_input.txt", 'wb') as file:
+            file.write(response.content)
+
+        compress_start_time = time.time()
+        rle_compress_file("RLE_input.txt", "RLE_compressed.rle")
+        print("---binary compress %s seconds ---" % (time.time() - compress_start_time))
+
+        decompress_start_time = time.time()
+        rle_decompress_file("RLE_compressed.rle", "RLE_decompressed.txt")
+        print("---binary decompress %s seconds ---" % (time.time() - decompress_start_time))
@@ -1,7 +1,3 @@
-import frequencies
-
-
-
 class ArithmeticCoderBase:
 
     def __init__(self, numbits):
@@ -17,10 +13,11 @@ class ArithmeticCoderBase:
         self.high = self.state_mask
 
     def update(self, freqs, symbol):
+        self.update_range(*freqs.get_range(symbol))
+
+    # Narrows the state to the [symlow, symhigh) part of a table with the given total
+    def update_range(self, symlow, symhigh, total):
         range = self.high - self.low + 1  # Calculate the current range based on low and high values
-        total = freqs.get_total()  # Retrieve total frequencies and frequencies for the specified symbol
-        symlow = freqs.get_low(symbol)
-        symhigh = freqs.get_high(symbol)
 
         # Update the low and high values based on the symbol's frequencies
         updated_low = self.low + symlow * range // total
@@ -59,19 +56,21 @@ class ArithmeticEncoder(ArithmeticCoderBase):
         self.output = bitout
 
     # Encodes the given symbol using the provided frequency table, updating the coder's state and writing out bits as necessary.
+    # The table must provide get_range, a table with only get_low/get_high can be wrapped in frequencies.FrequenciesTable.
     def write(self, freqs, symbol):
-        if not isinstance(freqs, frequencies.FrequenciesTable):
-            freqs = frequencies.FrequenciesTable(freqs)
-        self.update(freqs, symbol)
+        self.update_range(*freqs.get_range(symbol))
 
     # Shifts the current state of the encoder by writing out the most significant bit of 'low' to the output.
     # Handles potential underflow by writing opposite bits when necessary.
     def shift(self, is_compute=True):
         bit = self.low >> (self.num_state_bits - 1)  # Extract the most significant bit from 'low'
-        self.output.handle_file(bit)
+        count = self.num_underflow
+        if count == 0:
+            self.output.write_bit(bit)
+            return
 
-        for _ in range(self.num_underflow):
-            self.output.handle_file(bit ^ 1)
+        # The bit followed by 'count' opposite bits, written in one call
+        self.output.write_bits((bit << count) | ((1 << count) - 1 if bit == 0 else 0), count + 1)
         self.num_underflow = 0
 
     def underflow(self, is_compute=True):
@@ -80,7 +79,20 @@ class ArithmeticEncoder(ArithmeticCoderBase):
     # Completes the arithmetic coding process by flushing any buffered bits to ensure accurate decoding,
     # while keeping the output stream open.
     def finish(self):
-        self.output.handle_file(1)
+        self.output.write_bit(1)
+
+
+# ArithmeticEncoder that also keeps the total number of underflows, used when statistics are
+# collected so that the plain encoder does not pay for the counter
+class CountingArithmeticEncoder(ArithmeticEncoder):
+
+    def __init__(self, numbits, bitout):
+        super(CountingArithmeticEncoder, self).__init__(numbits, bitout)
+        self.underflows = 0
+
+    def underflow(self, is_compute=True):
+        self.num_underflow += 1
+        self.underflows += 1
 
 
 class ArithmeticDecoder(ArithmeticCoderBase):
@@ -95,9 +107,6 @@ class ArithmeticDecoder(ArithmeticCoderBase):
     # Decodes the next symbol using the provided frequency table and returns the result.
     # Additionally, updates the internal state of the arithmetic decoder and may consume more input bits.
     def read(self, freqs):
-        if not isinstance(freqs, frequencies.FrequenciesTable):
-            freqs = frequencies.FrequenciesTable(freqs)
-
         # Retrieve the total frequency count from the table
         total = freqs.get_total()
 
@@ -105,17 +114,10 @@ class ArithmeticDecoder(ArithmeticCoderBase):
         offset = self.code - self.low
         value = ((offset + 1) * total - 1) // current_range
 
-        # Perform a binary search to find the symbol whose cumulative frequency is closest to 'value'
-        start = 0
-        end = freqs.get_symbol_limit()
-        while end - start > 1:
-            middle = (start + end) >> 1  # Narrow the search range based on the current middle point
-            if freqs.get_low(middle) > value:
-                end = middle
-            else:
-                start = middle
-
-        self.update(freqs, start)
+        # Find the symbol whose cumulative frequency range contains 'value'
+        start = freqs.find_symbol(value)
+
+        self.update_range(*freqs.get_range(start))
         return start  # Return the decoded symbol.
 
     def shift(self, is_compute=True):
@@ -127,7 +129,88 @@ class ArithmeticDecoder(ArithmeticCoderBase):
     # Retrieves the next bit (0 or 1) from the input stream. If the stream ends,
     # it is assumed to produce an infinite sequence of trailing zeros.
     def read_code_bit(self):
-        temp = self.input.handle_file()
+        temp = self.input.read_bit()
         if temp == -1:
             temp = 0
         return temp
+
+
+# Range coder: same interface as ArithmeticEncoder/ArithmeticDecoder, but the state is renormalized
+# a whole byte at a time and a carry into the bytes already produced is propagated through 'cache'
+# (the last byte held back) and 'cache_size' (that byte plus the 0xFF bytes pending after it).
+# The total of a frequency table must not exceed 2^(numbits - 8).
+class RangeEncoder:
+
+    def __init__(self, numbits, bitout):
+        if numbits % 8 != 0 or numbits < 16:
+            raise ValueError("State size must be a multiple of 8 bits")
+        self.num_state_bits = numbits
+        self.full_range = 1 << numbits
+        self.top_value = 1 << (numbits - 8)  # The range is kept at or above this value
+        self.top_byte_limit = 0xFF << (numbits - 8)
+        self.low = 0
+        self.range = self.full_range - 1
+        self.cache = 0
+        self.cache_size = 1
+        self.output = bitout
+
+    def write(self, freqs, symbol):
+        symlow, symhigh, total = freqs.get_range(symbol)
+        step = self.range // total
+        self.low += step * symlow
+        self.range = step * (symhigh - symlow)
+        while self.range < self.top_value:
+            self.range <<= 8
+            self.shift_low()
+
+    # Moves the top byte of 'low' out, holding it back while a carry could still reach it
+    def shift_low(self):
+        if (self.low & (self.full_range - 1)) < self.top_byte_limit or self.low >= self.full_range:
+            carry = self.low >> self.num_state_bits
+            byte = self.cache
+            for _ in range(self.cache_size):
+                self.output.write_bits((byte + carry) & 0xFF, 8)
+                byte = 0xFF
+            self.cache_size = 0
+            self.cache = (self.low >> (self.num_state_bits - 8)) & 0xFF
+        self.cache_size += 1
+        self.low = (self.low & (self.top_value - 1)) << 8
+
+    # Flushes the remaining state bytes, keeping the output stream open
+    def finish(self):
+        for _ in range(self.num_state_bits // 8 + 1):
+            self.shift_low()
+
+
+class RangeDecoder:
+
+    def __init__(self, numbits, bitin):
+        if numbits % 8 != 0 or numbits < 16:
+            raise ValueError("State size must be a multiple of 8 bits")
+        self.num_state_bits = numbits
+        self.top_value = 1 << (numbits - 8)
+        self.range = (1 << numbits) - 1
+        self.input = bitin
+        self.code = 0
+        for _ in range(numbits // 8 + 1):  # The first byte is the encoder's initial empty cache
+            self.code = (self.code << 8) | self.read_byte()
+
+    def read(self, freqs):
+        total = freqs.get_total()
+        step = self.range // total
+        symbol = freqs.find_symbol(min(self.code // step, total - 1))
+
+        symlow, symhigh, _ = freqs.get_range(symbol)
+        self.code -= step * symlow
+        self.range = step * (symhigh - symlow)
+        while self.range < self.top_value:
+            self.code = (self.code << 8) | self.read_byte()
+            self.range <<= 8
+        return symbol
+
+    # Reads the next byte, the stream is assumed to continue with zeros past its end
+    def read_byte(self):
+        try:
+            return self.input.read_bits(8)
+        except EOFError:
+            return 0
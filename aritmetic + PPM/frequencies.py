@@ -1,24 +1,41 @@
+from array import array
+import bisect
+import itertools
+
+
+# Every table gives the coders get_range(symbol) -> (low, high, total) and find_symbol(value),
+# so a symbol is coded with a single call on the table itself.
+
 class SimpleFrequencyTable():
+    __slots__ = ("frequencies", "total", "cumulative")
+
+    # simple_or_flat="Flat" still gives a uniform table, it is a FlatFrequencyTable so that
+    # the methods here never have to check which kind they are
+    def __new__(cls, freqs=None, numsyms=None, simple_or_flat="Simple"):
+        if simple_or_flat == "Flat":
+            return FlatFrequencyTable(numsyms)
+        return super().__new__(cls)
 
     def __init__(self, freqs=None, numsyms=None, simple_or_flat="Simple"):
-        self.simple_or_flat = simple_or_flat
-        if self.simple_or_flat == "Flat":
-            self.numsymbols = numsyms    # For flat frequency table, just store the number of symbols
-        else:
-            self.frequencies = list(freqs)
-            self.total = sum(self.frequencies)  # Store the total sum of the frequencies
-            self.cumulative = None  # Cumulative frequency array
+        self.frequencies = list(freqs)
+        self.total = sum(self.frequencies)  # Store the total sum of the frequencies
+        self.cumulative = None  # Cumulative frequency array
+
+    # Returns an independent table with the same counts. The cumulative array is only ever
+    # replaced and never changed in place, so both tables can share it.
+    def copy(self):
+        table = SimpleFrequencyTable.__new__(SimpleFrequencyTable)
+        table.frequencies = self.frequencies[:]
+        table.total = self.total
+        table.cumulative = self.cumulative
+        return table
 
     # Returns the number of symbols in this frequency table
     def get_symbol_limit(self):
-        if self.simple_or_flat == "Flat":
-            return self.numsymbols
-        return len(self.frequencies)     # Simple
+        return len(self.frequencies)
 
     def get(self, symbol):
-        if self.simple_or_flat == "Flat":
-            return 1
-        return self.frequencies[symbol]     # Simple
+        return self.frequencies[symbol]
 
     # Sets the frequency of the given symbol and updates the total
     def set(self, symbol, freq):
@@ -35,39 +52,279 @@ class SimpleFrequencyTable():
 
     # Returns the total of all symbol frequencies
     def get_total(self):
-        if self.simple_or_flat == "Flat":
-            return self.numsymbols
         return self.total
 
     # Returns the sum of the frequencies below the given symbol
     def get_low(self, symbol):
-        if self.simple_or_flat == "Flat":
-            return symbol
         if self.cumulative is None:
             self._init_cumulative()
         return self.cumulative[symbol]
 
     # Returns the sum of frequencies up to and including the given symbol
     def get_high(self, symbol):
-        if self.simple_or_flat == "Flat":
-            return symbol + 1
         if self.cumulative is None:
             self._init_cumulative()
         return self.cumulative[symbol + 1]
 
+    # Returns (low, high, total) of the given symbol
+    def get_range(self, symbol):
+        cumul = self.cumulative
+        if cumul is None:
+            self._init_cumulative()
+            cumul = self.cumulative
+        return cumul[symbol], cumul[symbol + 1], self.total
+
+    # Returns the symbol whose [low, high) range contains the given cumulative value
+    def find_symbol(self, value):
+        if self.cumulative is None:
+            self._init_cumulative()
+        return bisect.bisect_right(self.cumulative, value) - 1
+
     # Computes the cumulative frequency array from scratch
     def _init_cumulative(self):
-        cumul = [0]
-        sum = 0
-        for freq in self.frequencies:
-            sum += freq
-            cumul.append(sum)
-        assert sum == self.total
+        cumul = list(itertools.accumulate(self.frequencies, initial=0))
+        assert cumul[-1] == self.total
         self.cumulative = cumul
 
 
 
-# A wrapper class that validates the arguments and results of the frequency table methods
+# Uniform frequency table, every symbol has frequency 1, used for the order -1 context
+class FlatFrequencyTable():
+    __slots__ = ("numsymbols",)
+
+    def __init__(self, numsyms):
+        self.numsymbols = numsyms
+
+    # Returns the number of symbols in this frequency table
+    def get_symbol_limit(self):
+        return self.numsymbols
+
+    def get(self, symbol):
+        return 1
+
+    # Returns the total of all symbol frequencies
+    def get_total(self):
+        return self.numsymbols
+
+    # Returns the sum of the frequencies below the given symbol
+    def get_low(self, symbol):
+        return symbol
+
+    # Returns the sum of frequencies up to and including the given symbol
+    def get_high(self, symbol):
+        return symbol + 1
+
+    # Returns (low, high, total) of the given symbol
+    def get_range(self, symbol):
+        return symbol, symbol + 1, self.numsymbols
+
+    # Returns the symbol whose [low, high) range contains the given cumulative value
+    def find_symbol(self, value):
+        return value
+
+
+
+# Frequency table backed by a Fenwick (binary indexed) tree, increments, prefix sums
+# and the symbol lookup by cumulative value all take O(log n) instead of a full rebuild
+class FenwickFrequencyTable():
+    __slots__ = ("frequencies", "total", "tree", "top_step")
+
+    def __init__(self, freqs):
+        self.frequencies = list(freqs)
+        self.total = sum(self.frequencies)
+        # Linear-time build: every node passes its partial sum on to its parent
+        self.tree = [0] + self.frequencies
+        if self.total != 0:
+            for index in range(1, len(self.tree)):
+                parent = index + (index & -index)
+                if parent < len(self.tree):
+                    self.tree[parent] += self.tree[index]
+        # Highest power of two not above the number of symbols, where find_symbol starts
+        self.top_step = 1 << (len(self.frequencies).bit_length() - 1) if self.frequencies else 0
+
+    # Returns an independent table with the same counts, without rebuilding the tree
+    def copy(self):
+        table = FenwickFrequencyTable.__new__(FenwickFrequencyTable)
+        table.frequencies = self.frequencies[:]
+        table.total = self.total
+        table.tree = self.tree[:]
+        table.top_step = self.top_step
+        return table
+
+    # Returns the number of symbols in this frequency table
+    def get_symbol_limit(self):
+        return len(self.frequencies)
+
+    def get(self, symbol):
+        return self.frequencies[symbol]
+
+    # Sets the frequency of the given symbol and updates the total
+    def set(self, symbol, freq):
+        delta = freq - self.frequencies[symbol]
+        self.total += delta
+        self.frequencies[symbol] = freq
+        self._add(symbol, delta)
+
+    # Increments the frequency of the given symbol and updates the total
+    def increment(self, symbol):
+        self.total += 1
+        self.frequencies[symbol] += 1
+        tree = self.tree
+        size = len(tree)
+        index = symbol + 1
+        while index < size:
+            tree[index] += 1
+            index += index & -index
+
+    # Returns the total of all symbol frequencies
+    def get_total(self):
+        return self.total
+
+    # Returns the sum of the frequencies below the given symbol
+    def get_low(self, symbol):
+        tree = self.tree
+        result = 0
+        while symbol > 0:
+            result += tree[symbol]
+            symbol &= symbol - 1
+        return result
+
+    # Returns the sum of frequencies up to and including the given symbol
+    def get_high(self, symbol):
+        return self.get_low(symbol) + self.frequencies[symbol]
+
+    # Returns (low, high, total) of the given symbol
+    def get_range(self, symbol):
+        tree = self.tree
+        low = 0
+        index = symbol
+        while index > 0:
+            low += tree[index]
+            index &= index - 1
+        return low, low + self.frequencies[symbol], self.total
+
+    # Returns the symbol whose [low, high) range contains the given cumulative value
+    def find_symbol(self, value):
+        tree = self.tree
+        size = len(self.frequencies)
+        position = 0
+        step = self.top_step
+        while step > 0:
+            if position + step <= size and tree[position + step] <= value:
+                position += step
+                value -= tree[position]
+            step >>= 1
+        return position
+
+    # Adds delta to the frequency of the given symbol inside the tree
+    def _add(self, symbol, delta):
+        tree = self.tree
+        size = len(tree)
+        index = symbol + 1
+        while index < size:
+            tree[index] += delta
+            index += index & -index
+
+
+
+# Frequency table storing only the symbols seen so far, for contexts where a handful of the
+# symbols ever occur. The seen symbols and their counts are two compact arrays in symbol order,
+# cumulative values are summed over the few counts when asked for and never kept.
+class SparseFrequencyTable():
+    __slots__ = ("numsymbols", "symbols", "counts", "total")
+
+    def __init__(self, freqs=None, numsyms=None):
+        self.symbols = array("H")
+        self.counts = array("I")
+        if freqs is not None:
+            numsyms = len(freqs)
+            for symbol, freq in enumerate(freqs):
+                if freq > 0:
+                    self.symbols.append(symbol)
+                    self.counts.append(freq)
+        self.numsymbols = numsyms
+        self.total = sum(self.counts)
+
+    # Returns an independent table with the same counts
+    def copy(self):
+        table = SparseFrequencyTable.__new__(SparseFrequencyTable)
+        table.numsymbols = self.numsymbols
+        table.symbols = self.symbols[:]
+        table.counts = self.counts[:]
+        table.total = self.total
+        return table
+
+    # Returns the number of symbols in this frequency table
+    def get_symbol_limit(self):
+        return self.numsymbols
+
+    def get(self, symbol):
+        symbols = self.symbols
+        index = bisect.bisect_left(symbols, symbol)
+        if index < len(symbols) and symbols[index] == symbol:
+            return self.counts[index]
+        return 0
+
+    # Sets the frequency of the given symbol and updates the total
+    def set(self, symbol, freq):
+        symbols = self.symbols
+        index = bisect.bisect_left(symbols, symbol)
+        if index < len(symbols) and symbols[index] == symbol:
+            self.total += freq - self.counts[index]
+            if freq > 0:
+                self.counts[index] = freq
+            else:
+                del symbols[index]
+                del self.counts[index]
+        elif freq > 0:
+            symbols.insert(index, symbol)
+            self.counts.insert(index, freq)
+            self.total += freq
+
+    # Increments the frequency of the given symbol and updates the total
+    def increment(self, symbol):
+        symbols = self.symbols
+        index = bisect.bisect_left(symbols, symbol)
+        if index < len(symbols) and symbols[index] == symbol:
+            self.counts[index] += 1
+        else:
+            symbols.insert(index, symbol)
+            self.counts.insert(index, 1)
+        self.total += 1
+
+    # Returns the total of all symbol frequencies
+    def get_total(self):
+        return self.total
+
+    # Returns the sum of the frequencies below the given symbol
+    def get_low(self, symbol):
+        return sum(self.counts[:bisect.bisect_left(self.symbols, symbol)])
+
+    # Returns the sum of frequencies up to and including the given symbol
+    def get_high(self, symbol):
+        return self.get_low(symbol) + self.get(symbol)
+
+    # Returns (low, high, total) of the given symbol
+    def get_range(self, symbol):
+        symbols = self.symbols
+        index = bisect.bisect_left(symbols, symbol)
+        low = sum(self.counts[:index])
+        if index < len(symbols) and symbols[index] == symbol:
+            return low, low + self.counts[index], self.total
+        return low, low, self.total
+
+    # Returns the symbol whose [low, high) range contains the given cumulative value
+    def find_symbol(self, value):
+        for index, freq in enumerate(self.counts):
+            if value < freq:
+                return self.symbols[index]
+            value -= freq
+        raise ValueError("Value out of range")
+
+
+
+# A wrapper class that validates the arguments and results of the frequency table methods,
+# it also gives get_range and find_symbol to a table that only has get_low/get_high
 class FrequenciesTable():
 
     def __init__(self, freqtab):
@@ -105,6 +362,27 @@ class FrequenciesTable():
         else:
             self.freqtable.get_high(symbol)
 
+    # Returns (low, high, total) of the given symbol
+    def get_range(self, symbol):
+        if not self._is_symbol_in_range(symbol):
+            raise ValueError("Symbol out of range")
+        return self.freqtable.get_low(symbol), self.freqtable.get_high(symbol), self.freqtable.get_total()
+
+    # Returns the symbol whose [low, high) range contains the given cumulative value, using the
+    # table's own lookup when it has one and a binary search over get_low otherwise
+    def find_symbol(self, value):
+        if hasattr(self.freqtable, "find_symbol"):
+            return self.freqtable.find_symbol(value)
+        start = 0
+        end = self.get_symbol_limit()
+        while end - start > 1:
+            middle = (start + end) >> 1  # Narrow the search range based on the current middle point
+            if self.freqtable.get_low(middle) > value:
+                end = middle
+            else:
+                start = middle
+        return start
+
     # Sets the frequency of the given symbol
     def set(self, symbol, freq):
         self.freqtable.set(symbol, freq)
@@ -1,12 +1,26 @@
 import contextlib
 from datetime import datetime
 import filecmp
+import functools
+import io
+import mmap
+import os
+import sys
 import arithmeticcoding
+import frequencies
 import ppm_model
-import requests
+import struct
+
+# The bit I/O module is shared with the other algorithms in the parent folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bitio
+import blockio
+import instrumentation
 
 
 def main():
+    import requests  # Only the demo downloads its input
+
     input_file_url = 'https://raw.githubusercontent.com/kzjeef/algs4/master/burrows-wheelers/testfile/dickens.txt'
     response = requests.get(input_file_url)
     input_data = response.text
@@ -20,14 +34,11 @@ def main():
     print("Encoding:")
     print(datetime.now().strftime("%H:%M:%S"))
     # File compression
-    with open(input_file, "rb") as inp, contextlib.closing(ppm_model.BitStream(open(compressed_file, "wb"))) as bit_file:
-        compress(inp, bit_file)
+    compress_file(input_file, compressed_file)
 
     print("\nDecoding:")
     print(datetime.now().strftime("%H:%M:%S"))
-    with open(compressed_file, "rb") as comp_file, open(decompressed_file, "wb") as decomp_file:
-        bitin = ppm_model.BitStream(comp_file, "read")
-        decompress(bitin, decomp_file)
+    decompress_file(compressed_file, decompressed_file)
 
     print("\nDone:")
     print(datetime.now().strftime("%H:%M:%S"))
@@ -36,80 +47,222 @@ def main():
     print(f"\n\nValidation: Files are {'identical' if are_identical else 'different'}")
 
 
-def compress(inp, bit_file):
-    # Initialize the arithmetic encoder with a precision of 32 bits and output stream bit_file
-    encode = arithmeticcoding.ArithmeticEncoder(32, bit_file)
-    model = ppm_model.PpmModel(3, 257, 256)
-    history = []    # Track context symbols
+# Entropy coders the model can drive: (encoder class, decoder class, state bits). The range
+# coder works on whole bytes and gets a wider state so large context totals stay supported.
+CODERS = {"arithmetic": (arithmeticcoding.ArithmeticEncoder, arithmeticcoding.ArithmeticDecoder, 32),
+          "range": (arithmeticcoding.RangeEncoder, arithmeticcoding.RangeDecoder, 64)}
+# Coder used by every entry point unless told otherwise. A single stream has no header, so it
+# must be decoded with the coder it was encoded with, and streams written before the range
+# coder existed all use the arithmetic one.
+DEFAULT_CODER = "arithmetic"
+
+
+# Block container: magic, block size, number of blocks, model order, coder, budget policy and
+# context budget (0 for none), then the block index of blockio followed by the compressed blocks in order
+PPM_BLOCKS_MAGIC = b"PPMB"
+PPM_BLOCKS_HEADER = struct.Struct(">4sQIBBBQ")
+CODER_IDS = {"arithmetic": 0, "range": 1}
+BUDGET_POLICY_IDS = {"restart": 0, "prune": 1}
+
+
+# Input is consumed in chunks of this size, decoded bytes are written in blocks of this size
+INPUT_CHUNK_SIZE = 1 << 16
+OUTPUT_BUFFER_SIZE = 1 << 16
 
+
+# Yields the input as chunks to iterate byte by byte. A bytes-like object or a memory mapped
+# file is used in place through a memoryview, a stream is read in large chunks.
+def iter_input_chunks(inp, chunk_size=INPUT_CHUNK_SIZE):
+    if isinstance(inp, (bytes, bytearray, memoryview, mmap.mmap)):
+        with memoryview(inp) as view, view.cast("B") as data:
+            yield data
+        return
     while True:
-        symbol = inp.read(1)         # Read and encode one byte
-        if len(symbol) == 0:
+        chunk = inp.read(chunk_size)
+        if len(chunk) == 0:
             break
-        symbol = symbol[0]
-        encode_symbol(model, history, symbol, encode)
-        model.increment_contexts(history, symbol)
-
-        if model.model_order >= 1:
-            # Dropping oldest symbol (if necessary)
-            if len(history) == model.model_order:
-                history.pop()
-            history.insert(0, symbol)   # Add the new symbol to the beginning of the history
-
-    encode_symbol(model, history, 256, encode)  # EOF
-    encode.finish()
-
-def decompress(bitin, out):
-    # Initialize the arithmetic decoder with a precision of 32 bits and input stream bitin
-    decode = arithmeticcoding.ArithmeticDecoder(32, bitin)
-    model = ppm_model.PpmModel(3, 257, 256)
-    history = []
+        yield chunk
+
+
+# inp can be a binary stream or a bytes-like object. A Stats object given as stats receives the
+# escapes per order, the coder underflows, the cumulative table rebuilds and the model size.
+# A primed model (see PpmModel.train and PpmModel.load) can be given to start from instead of an
+# empty one, the decoder needs the same one. It is updated while coding, so give a fresh copy each call.
+def compress(inp, bit_file, table_type="fenwick", order=3, max_contexts=None, budget_policy="restart",
+             coder=DEFAULT_CODER, model=None, stats=None):
+    # Initialize the encoder with its state precision and output stream bit_file
+    encoder_class, _, numbits = CODERS[coder]
+    if model is None:
+        model = ppm_model.PpmModel(order, 257, 256, table_type, max_contexts, budget_policy)
+    escapes = rebuilds = None
+    if stats is None:
+        stats = instrumentation.NULL_STATS
+    else:
+        escapes = [0] * (max(model.model_order, 0) + 1)
+        rebuilds = [0]
+        if encoder_class is arithmeticcoding.ArithmeticEncoder:
+            encoder_class = arithmeticcoding.CountingArithmeticEncoder
+    encode = encoder_class(numbits, bit_file)
+
+    with stats.timer("compress"):
+        for chunk in iter_input_chunks(inp):
+            for symbol in chunk:    # Encode one byte
+                encode_symbol(model, symbol, encode, escapes, rebuilds)
+                model.update(symbol)    # The model keeps track of the context symbols
+
+        encode_symbol(model, 256, encode, escapes, rebuilds)  # EOF
+        encode.finish()
+
+    if escapes is not None:
+        for context_order, count in enumerate(escapes):
+            stats.count("escapes_order_%d" % context_order, count)
+        if hasattr(encode, "underflows"):  # The range coder has no underflows
+            stats.count("underflows", encode.underflows)
+        if model.table_class is frequencies.SimpleFrequencyTable:  # The others keep no cumulative array
+            stats.count("cumulative_rebuilds", rebuilds[0])
+        stats.set("contexts", model.num_contexts)
+
+def decompress(bitin, out, table_type="fenwick", order=3, max_contexts=None, budget_policy="restart",
+               coder=DEFAULT_CODER, model=None):
+    # Initialize the decoder with its state precision and input stream bitin
+    _, decoder_class, numbits = CODERS[coder]
+    decode = decoder_class(numbits, bitin)
+    if model is None:
+        model = ppm_model.PpmModel(order, 257, 256, table_type, max_contexts, budget_policy)
     EOF_SYM = 256
 
+    buffer = bytearray()
     while True:
-        symbol = decode_symbol(decode, model, history)     # Decode and write one byte
+        symbol = decode_symbol(decode, model)     # Decode and buffer one byte
         if symbol == EOF_SYM:
             break
-        out.write(bytes((symbol,)))
-        model.increment_contexts(history, symbol)
+        buffer.append(symbol)
+        if len(buffer) >= OUTPUT_BUFFER_SIZE:
+            out.write(buffer)
+            buffer = bytearray()
+        model.update(symbol)
+    out.write(buffer)
+
+# File entry points, the input file is memory mapped instead of read into memory
+def compress_file(input_file, output_file, table_type="fenwick", order=3, max_contexts=None,
+                  budget_policy="restart", coder=DEFAULT_CODER, model=None):
+    with open(input_file, "rb") as inp, contextlib.closing(bitio.BitWriter(open(output_file, "wb"))) as bit_file:
+        if os.fstat(inp.fileno()).st_size == 0:  # An empty file cannot be mapped
+            compress(b"", bit_file, table_type, order, max_contexts, budget_policy, coder, model)
+            return
+        with mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            compress(data, bit_file, table_type, order, max_contexts, budget_policy, coder, model)
+
+def decompress_file(input_file, output_file, table_type="fenwick", order=3, max_contexts=None,
+                    budget_policy="restart", coder=DEFAULT_CODER, model=None):
+    with open(input_file, "rb") as inp, open(output_file, "wb") as out:
+        decompress(bitio.BitReader(inp), out, table_type, order, max_contexts, budget_policy, coder, model)
+
+# Snapshots parsed so far in this process, keyed by the file and the settings they were loaded with
+LOADED_SNAPSHOTS = {}
+
+# Model to start from, loaded from the snapshot file when one is given. The file is parsed once per
+# process and every record gets its own copy, a rewritten file (new size or mtime) is parsed again.
+def load_model(snapshot, table_type, max_contexts, budget_policy):
+    if snapshot is None:
+        return None
+    status = os.stat(snapshot)
+    key = (os.path.abspath(snapshot), status.st_size, status.st_mtime_ns, table_type, max_contexts, budget_policy)
+    model = LOADED_SNAPSHOTS.get(key)
+    if model is None:
+        model = ppm_model.PpmModel.load(snapshot, table_type, max_contexts, budget_policy)
+        LOADED_SNAPSHOTS[key] = model
+    return model.copy()
+
+def compress_bytes(data, table_type="fenwick", order=3, max_contexts=None, budget_policy="restart",
+                   coder=DEFAULT_CODER, snapshot=None, stats=None):
+    # Compress a whole buffer with a fresh or primed model, the result is padded to a byte boundary
+    out = io.BytesIO()
+    bit_file = bitio.BitWriter(out)
+    model = load_model(snapshot, table_type, max_contexts, budget_policy)
+    compress(data, bit_file, table_type, order, max_contexts, budget_policy, coder, model, stats)
+    bit_file.align()
+    bit_file.flush()
+    return out.getvalue()
 
-        if model.model_order >= 1:
-            if len(history) == model.model_order:
-                history.pop()   # Remove the oldest symbol from history
-            history.insert(0, symbol)
+def decompress_bytes(byte_data, table_type="fenwick", order=3, max_contexts=None, budget_policy="restart",
+                     coder=DEFAULT_CODER, snapshot=None):
+    out = io.BytesIO()
+    model = load_model(snapshot, table_type, max_contexts, budget_policy)
+    decompress(bitio.BitReader(io.BytesIO(byte_data)), out, table_type, order, max_contexts, budget_policy, coder,
+               model)
+    return out.getvalue()
 
-def encode_symbol(model, history, symbol, enc):
-    # Use the highest order context with a non-zero frequency
+def compress_blocks(data, block_size=1 << 22, workers=None, table_type="fenwick", order=3, max_contexts=None,
+                    budget_policy="restart", coder=DEFAULT_CODER, snapshot=None):
+    # Split the input into fixed-size blocks, each one is compressed with its own model
+    # in a separate process, so blocks share no statistics. With a snapshot every block
+    # starts from the primed model, which decompression must be given as well.
+    blocks = blockio.split_blocks(data, block_size)
+    compress_block = functools.partial(compress_bytes, table_type=table_type, order=order,
+                                       max_contexts=max_contexts, budget_policy=budget_policy, coder=coder,
+                                       snapshot=snapshot)
+    compressed_blocks = blockio.run_blocks(compress_block, blocks, workers)
+
+    out = bytearray(PPM_BLOCKS_HEADER.pack(PPM_BLOCKS_MAGIC, block_size, len(blocks), order, CODER_IDS[coder],
+                                           BUDGET_POLICY_IDS[budget_policy], max_contexts or 0))
+    blockio.write_block_index(out, blocks, compressed_blocks)
+    return bytes(out)
+
+def read_block_header(byte_data):
+    # Returns the model settings and a list of (offset, compressed length, original length), one per block
+    magic, block_size, num_blocks, order, coder_id, policy_id, max_contexts = PPM_BLOCKS_HEADER.unpack_from(byte_data, 0)
+    if magic != PPM_BLOCKS_MAGIC:
+        raise ValueError("Not a PPM block container")
+    settings = {"order": order,
+                "coder": {v: k for k, v in CODER_IDS.items()}[coder_id],
+                "budget_policy": {v: k for k, v in BUDGET_POLICY_IDS.items()}[policy_id],
+                "max_contexts": max_contexts or None}
+    return settings, blockio.read_block_index(byte_data, PPM_BLOCKS_HEADER.size, num_blocks)
+
+def decompress_block(byte_data, block_number, table_type="fenwick", snapshot=None):
+    # Decode a single block without touching the others
+    settings, block_index = read_block_header(byte_data)
+    offset, compressed_length, _ = block_index[block_number]
+    return decompress_bytes(bytes(byte_data[offset:offset + compressed_length]), table_type, snapshot=snapshot,
+                            **settings)
+
+def decompress_blocks(byte_data, workers=None, table_type="fenwick", snapshot=None):
+    settings, block_index = read_block_header(byte_data)
+    blocks = [bytes(byte_data[offset:offset + compressed_length]) for offset, compressed_length, _ in block_index]
+    decompress_block = functools.partial(decompress_bytes, table_type=table_type, snapshot=snapshot, **settings)
+    return b"".join(blockio.run_blocks(decompress_block, blocks, workers))
+
+def encode_symbol(model, symbol, enc, escapes=None, rebuilds=None):
+    # Use the highest order context with a non-zero frequency, starting from the deepest
+    # active context and following the suffix pointers down to order 0
     # If symbol 256 appears, escape to a lower order or signal EOF at order -1
-    for order in reversed(range(len(history) + 1)):
-        ctx = model.root_context
-        for sym in history[: order]:
-            assert ctx.subcontexts is not None
-            ctx = ctx.subcontexts[sym]
-            if ctx is None:
-                break
-        else:
-            if symbol != 256 and ctx.frequencies.get(symbol) > 0:
-                enc.write(ctx.frequencies, symbol)
-                return
-
-            enc.write(ctx.frequencies, 256)
+    # escapes and rebuilds, given together for statistics, count the escapes out of each order
+    # and the cumulative arrays the coder is about to rebuild (rebuilds[0])
+    ctx = model.active_context
+    context_order = model.active_depth
+    while ctx is not None:
+        if escapes is not None and getattr(ctx.frequencies, "cumulative", 0) is None:
+            rebuilds[0] += 1
+        if symbol != 256 and ctx.frequencies.get(symbol) > 0:
+            enc.write(ctx.frequencies, symbol)
+            return
+
+        enc.write(ctx.frequencies, 256)
+        if escapes is not None:
+            escapes[context_order] += 1
+        ctx = ctx.suffix
+        context_order -= 1
 
     enc.write(model.order_minus1_freqs, symbol)
 
-def decode_symbol(dec, model, history):
-    # Ensure valid input: order must be >= -1, escape symbol must be within symbol limit
-    for order in reversed(range(len(history) + 1)):
-        ctx = model.root_context
-        for sym in history[: order]:
-            assert ctx.subcontexts is not None
-            ctx = ctx.subcontexts[sym]
-            if ctx is None:
-                break
-        else:
-            symbol = dec.read(ctx.frequencies)
-            if symbol < 256:
-                return symbol
+def decode_symbol(dec, model):
+    ctx = model.active_context
+    while ctx is not None:
+        symbol = dec.read(ctx.frequencies)
+        if symbol < 256:
+            return symbol
+        ctx = ctx.suffix
     return dec.read(model.order_minus1_freqs)
 
 if __name__ == "__main__":
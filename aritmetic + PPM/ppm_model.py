@@ -1,5 +1,13 @@
+from array import array
+from collections import deque
 import frequencies
+import itertools
+import mmap
+import struct
+import sys
 
+# Unbuffered bit stream reading or writing one byte at a time, bitio.BitReader and
+# bitio.BitWriter offer the same read_bit/write_bit/write_bits calls with large buffers.
 class BitStream:
 
     # Constructs a bit input stream based on the given byte input stream.
@@ -44,22 +52,265 @@ class BitStream:
                 self.currentbyte = 0
                 self.numbits = 0
 
+    def read_bit(self):
+        return self.handle_file()
+
+    def write_bit(self, b):
+        self.handle_file(b)
+
+    def write_bits(self, value, count):
+        for shift in reversed(range(count)):
+            self.handle_file((value >> shift) & 1)
+
+    def read_bits(self, count):
+        value = 0
+        for _ in range(count):
+            bit = self.handle_file()
+            if bit == -1:
+                raise EOFError("End of bit stream")
+            value = (value << 1) | bit
+        return value
+
 
 
 
 class PpmModel:
 
-    def __init__(self, order, symbollimit, escapesymbol):
+    # Frequency table classes a context can be built on, "fenwick" keeps increments and
+    # cumulative lookups at O(log n) instead of rebuilding the cumulative array, "sparse" only
+    # stores the symbols seen in each context, which keeps high orders affordable in memory
+    TABLE_TYPES = {"simple": frequencies.SimpleFrequencyTable, "fenwick": frequencies.FenwickFrequencyTable,
+                   "sparse": frequencies.SparseFrequencyTable}
+
+    # What to do once the model holds more than max_contexts contexts: "restart" from an empty
+    # model, or "prune" by halving every count and dropping the contexts left without symbols
+    # until at most half the budget is used. Encoder and decoder see the same updates, so they
+    # apply the policy at the same point.
+    BUDGET_POLICIES = ("restart", "prune")
+
+    # Snapshot of a model: magic, order, symbol limit, escape symbol and number of contexts, then
+    # the contexts in pre-order, each as its number of seen symbols and of sub-contexts, the
+    # (symbol, count) pairs and then every sub-context preceded by the symbol leading to it
+    SNAPSHOT_MAGIC = b"PPMS"
+    SNAPSHOT_HEADER = struct.Struct(">4sbHHI")
+    CONTEXT_HEADER = struct.Struct(">HH")
+    SYMBOL_COUNT = struct.Struct(">HI")
+    SUBCONTEXT_SYMBOL = struct.Struct(">H")
+
+    def __init__(self, order, symbollimit, escapesymbol, table_type="simple", max_contexts=None,
+                 budget_policy="restart"):
+        if budget_policy not in PpmModel.BUDGET_POLICIES:
+            raise ValueError("Unknown budget policy: %s" % budget_policy)
+        # The root context always stays, pruning down to half the budget needs room for more than it
+        if max_contexts is not None and max_contexts < (2 if budget_policy == "prune" else 1):
+            raise ValueError("max_contexts must be at least %d with the %s policy"
+                             % (2 if budget_policy == "prune" else 1, budget_policy))
         self.model_order = order
         self.symbol_limit = symbollimit
         self.escape_symbol = escapesymbol
+        self.table_class = PpmModel.TABLE_TYPES[table_type]
+        self.max_contexts = max_contexts
+        self.budget_policy = budget_policy
 
+        self.root_context = None
+        self.num_contexts = 0
         if order >= 0:
-            self.root_context = PpmModel.Context(symbollimit, order >= 1)
-            self.root_context.frequencies.increment(escapesymbol)
-        else:
-            self.root_context = None
-        self.order_minus1_freqs = frequencies.SimpleFrequencyTable(numsyms=symbollimit, simple_or_flat="Flat")
+            self._reset_root()
+        self.order_minus1_freqs = frequencies.FlatFrequencyTable(symbollimit)
+
+        # Last symbols seen, most recent first, and the deepest existing context for them.
+        # The lower order contexts are reached from it through the suffix pointers.
+        self.history = deque(maxlen=max(order, 0))
+        self.active_context = self.root_context
+        self.active_depth = 0
+
+    def _reset_root(self):
+        self.root_context = PpmModel.Context(self.symbol_limit, self.model_order >= 1, self.table_class)
+        self.root_context.frequencies.increment(self.escape_symbol)
+        self.num_contexts = 1
+
+    # Counts symbol in the contexts of the model's own history and moves the history forward.
+    # Each context of the active chain is touched once, the new active context is found with
+    # a single walk from the root.
+    def update(self, symbol):
+        if self.model_order == -1:
+            return
+        history = self.history
+
+        # Contexts of the current history that do not exist yet go below the deepest one
+        ctx = self.active_context
+        if type(ctx) is PpmModel.SharedContext:
+            ctx = self._own_active_path()
+        depth = self.active_depth
+        while depth < len(history):
+            sym = history[depth]
+            depth += 1
+            child = PpmModel.Context(self.symbol_limit, depth < self.model_order, self.table_class, ctx)
+            child.frequencies.increment(self.escape_symbol)
+            PpmModel._subcontexts(ctx)[sym] = child
+            self.num_contexts += 1
+            ctx = child
+
+        while ctx is not None:
+            ctx.frequencies.increment(symbol)
+            ctx = ctx.suffix
+
+        if self.max_contexts is not None and self.num_contexts > self.max_contexts:
+            self.enforce_budget()
+
+        history.appendleft(symbol)
+        ctx = self.root_context
+        depth = 0
+        for sym in history:
+            subctxs = ctx.subcontexts
+            if subctxs is None:
+                break
+            child = subctxs[sym]
+            if child is None:
+                break
+            ctx = child
+            depth += 1
+        self.active_context = ctx
+        self.active_depth = depth
+        # The coder follows the suffix pointers of the active context, they must lead to the
+        # contexts counted above and not to the shared originals
+        if type(ctx) is PpmModel.SharedContext:
+            self._own_active_path()
+
+    # Forgets the recent symbols, the next symbol is coded as if it started a new message
+    def reset_history(self):
+        self.history.clear()
+        self.active_context = self.root_context
+        self.active_depth = 0
+
+    # Primes the model with a sample of the data it will code. Encoder and decoder must start
+    # from the same primed model, which is what save/load are for.
+    def train(self, data):
+        for symbol in data:
+            self.update(symbol)
+        self.reset_history()
+
+    def to_bytes(self):
+        if self.root_context is None:
+            raise ValueError("An order -1 model has no statistics to save")
+        out = bytearray(PpmModel.SNAPSHOT_HEADER.pack(PpmModel.SNAPSHOT_MAGIC, self.model_order, self.symbol_limit,
+                                                      self.escape_symbol, self.num_contexts))
+        self._write_context(self.root_context, out)
+        return bytes(out)
+
+    def _write_context(self, ctx, out):
+        seen = seen_counts(ctx.frequencies)
+        children = [(sym, child) for sym, child in subcontext_items(ctx) if child is not None]
+        out += PpmModel.CONTEXT_HEADER.pack(len(seen), len(children))
+        for symbol, freq in seen:
+            out += PpmModel.SYMBOL_COUNT.pack(symbol, freq)
+        for sym, child in children:
+            out += PpmModel.SUBCONTEXT_SYMBOL.pack(sym)
+            self._write_context(child, out)
+
+    # Builds a model from a snapshot made by to_bytes. data can be any buffer, a memory mapped
+    # file included; the suffix pointers are not stored and get rebuilt from the tree.
+    @classmethod
+    def from_bytes(cls, data, table_type="simple", max_contexts=None, budget_policy="restart"):
+        magic, order, symbollimit, escapesymbol, num_contexts = PpmModel.SNAPSHOT_HEADER.unpack_from(data, 0)
+        if magic != PpmModel.SNAPSHOT_MAGIC:
+            raise ValueError("Not a PPM model snapshot")
+        model = cls(order, symbollimit, escapesymbol, table_type, max_contexts, budget_policy)
+        model.root_context, _ = model._read_context(data, PpmModel.SNAPSHOT_HEADER.size, 0, None)
+        model.num_contexts = num_contexts
+        model.reset_history()
+        return model
+
+    # Returns the context stored at offset and the offset just after it
+    def _read_context(self, data, offset, depth, suffix):
+        num_symbols, num_children = PpmModel.CONTEXT_HEADER.unpack_from(data, offset)
+        offset += PpmModel.CONTEXT_HEADER.size
+        counts = [0] * self.symbol_limit
+        end = offset + num_symbols * PpmModel.SYMBOL_COUNT.size
+        for symbol, freq in PpmModel.SYMBOL_COUNT.iter_unpack(data[offset:end]):
+            counts[symbol] = freq
+        offset = end
+
+        ctx = PpmModel.Context(self.symbol_limit, depth < self.model_order, self.table_class, suffix)
+        ctx.frequencies = self.table_class(counts)
+        for _ in range(num_children):
+            (sym,) = PpmModel.SUBCONTEXT_SYMBOL.unpack_from(data, offset)
+            PpmModel._subcontexts(ctx)[sym], offset = self._read_context(
+                data, offset + PpmModel.SUBCONTEXT_SYMBOL.size, depth + 1, ctx)
+        return ctx, offset
+
+    # Sub-context table of ctx for adding a sub-context, a sparse context only gets one then
+    @staticmethod
+    def _subcontexts(ctx):
+        subctxs = ctx.subcontexts
+        if subctxs is None:
+            subctxs = ctx.subcontexts = PpmModel.SparseSubcontexts()
+        return subctxs
+
+    # Returns an independent model with the same statistics, starting with an empty history.
+    # Both models share the context tree: a shared context is never changed, the first time
+    # one of them counts in it, the context and the path to it from the root are cloned for
+    # that model alone. A copy costs nothing once the tree is shared, a model copied for
+    # every record only pays for the contexts the record touches.
+    def copy(self):
+        self._share_tree()
+        model = PpmModel.__new__(PpmModel)
+        model.__dict__.update(self.__dict__)
+        model.history = deque(maxlen=self.history.maxlen)
+        model.reset_history()
+        return model
+
+    # Marks the contexts owned by this model as shared, the ones below a shared context already are
+    def _share_tree(self):
+        stack = [self.root_context] if self.root_context is not None else []
+        while stack:
+            ctx = stack.pop()
+            if type(ctx) is PpmModel.SharedContext:
+                continue
+            ctx.__class__ = PpmModel.SharedContext
+            if ctx.subcontexts is not None:
+                children = ctx.subcontexts.values() if isinstance(ctx.subcontexts, dict) else ctx.subcontexts
+                stack.extend(child for child in children if child is not None)
+
+    # Clones the shared contexts from the root down to the active context and returns it
+    def _own_active_path(self):
+        ctx = self._own_root()
+        for sym in itertools.islice(self.history, self.active_depth):
+            ctx = self._own_child(ctx, sym)
+        self.active_context = ctx
+        return ctx
+
+    def _own_root(self):
+        ctx = self.root_context
+        if type(ctx) is PpmModel.SharedContext:
+            ctx = self.root_context = PpmModel._clone_context(ctx, None)
+        return ctx
+
+    # Sub-context sym of ctx, which this model owns, cloned first if it is shared
+    def _own_child(self, ctx, sym):
+        child = ctx.subcontexts[sym]
+        if type(child) is PpmModel.SharedContext:
+            child = ctx.subcontexts[sym] = PpmModel._clone_context(child, ctx)
+        return child
+
+    # The clone gets its own counts and sub-context table, the sub-contexts themselves stay shared
+    @staticmethod
+    def _clone_context(ctx, suffix):
+        clone = PpmModel.Context.__new__(PpmModel.Context)
+        clone.frequencies = ctx.frequencies.copy()
+        clone.subcontexts = None if ctx.subcontexts is None else type(ctx.subcontexts)(ctx.subcontexts)
+        clone.suffix = suffix
+        return clone
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    # The snapshot is memory mapped read-only, processes loading the same file share its pages
+    @classmethod
+    def load(cls, path, table_type="simple", max_contexts=None, budget_policy="restart"):
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as snapshot:
+            return cls.from_bytes(snapshot, table_type, max_contexts, budget_policy)
 
     def increment_contexts(self, history, symbol):
         if self.model_order == -1:
@@ -67,21 +318,114 @@ class PpmModel:
         if not ((len(history) <= self.model_order) and (0 <= symbol < self.symbol_limit)):
             raise ValueError()
 
-        ctx = self.root_context
+        ctx = self._own_root()
         ctx.frequencies.increment(symbol)
         for (i, sym) in enumerate(history):
-            subctxs = ctx.subcontexts
-            assert subctxs is not None
-
+            subctxs = PpmModel._subcontexts(ctx)
             if subctxs[sym] is None:
-                subctxs[sym] = PpmModel.Context(self.symbol_limit, i + 1 < self.model_order)
+                subctxs[sym] = PpmModel.Context(self.symbol_limit, i + 1 < self.model_order, self.table_class, ctx)
                 subctxs[sym].frequencies.increment(self.escape_symbol)
-            ctx = subctxs[sym]
+                self.num_contexts += 1
+            ctx = self._own_child(ctx, sym)
             ctx.frequencies.increment(symbol)
 
+        if self.max_contexts is not None and self.num_contexts > self.max_contexts:
+            self.enforce_budget()
+
+    def enforce_budget(self):
+        if self.budget_policy == "restart":
+            self._reset_root()
+            return
+        while self.num_contexts > self.max_contexts // 2:
+            self.num_contexts = 1
+            self._halve_counts(self._own_root())
+
+    # Halves the counts of ctx and its sub-contexts, dropping the sub-contexts left without any
+    # symbol. Returns True when ctx itself has no symbol left. The escape count is kept as it is.
+    def _halve_counts(self, ctx):
+        freqs = ctx.frequencies
+        for symbol, freq in seen_counts(freqs):
+            if symbol != self.escape_symbol:
+                freqs.set(symbol, freq // 2)
+
+        subctxs = ctx.subcontexts
+        if subctxs is not None:
+            for sym, child in subcontext_items(ctx):
+                if child is None:
+                    continue
+                child = self._own_child(ctx, sym)
+                if self._halve_counts(child):
+                    if isinstance(subctxs, dict):
+                        del subctxs[sym]
+                    else:
+                        subctxs[sym] = None
+                else:
+                    self.num_contexts += 1
+            if isinstance(subctxs, dict) and not subctxs:
+                ctx.subcontexts = None
+        return freqs.get_total() == freqs.get(self.escape_symbol)
+
+    # Approximate memory held by the context tree, to size the model per worker
+    def memory_usage(self):
+        total_bytes = 0
+        stack = [self.root_context] if self.root_context is not None else []
+        while stack:
+            ctx = stack.pop()
+            total_bytes += sys.getsizeof(ctx) + sys.getsizeof(ctx.frequencies)
+            for value in attribute_values(ctx.frequencies):
+                if isinstance(value, (list, dict, array)):
+                    total_bytes += sys.getsizeof(value)
+            if ctx.subcontexts is not None:
+                total_bytes += sys.getsizeof(ctx.subcontexts)
+                children = ctx.subcontexts.values() if isinstance(ctx.subcontexts, dict) else ctx.subcontexts
+                stack.extend(child for child in children if child is not None)
+        return {"contexts": self.num_contexts, "bytes": total_bytes}
+
+    # Sub-contexts of a sparse context, looking up an unseen symbol gives None like the dense list.
+    # A sparse context has None until its first sub-context is added.
+    class SparseSubcontexts(dict):
+        __slots__ = ()
+
+        def __missing__(self, symbol):
+            return None
+
     # Context - Helper structure
+    # The tree is keyed by the most recent symbol first, so the context one order below
+    # (its suffix, dropping the oldest symbol) is the parent.
     class Context:
+        __slots__ = ("frequencies", "subcontexts", "suffix")
+
+        def __init__(self, symbols, hassubctx, table_class=frequencies.SimpleFrequencyTable, suffix=None):
+            self.suffix = suffix
+            if table_class is frequencies.SparseFrequencyTable:
+                self.frequencies = table_class(numsyms=symbols)
+                self.subcontexts = None
+            else:
+                self.frequencies = table_class([0] * symbols)
+                self.subcontexts = ([None] * symbols) if hassubctx else None
+
+    # Context shared by several models after PpmModel.copy, same layout as Context
+    class SharedContext(Context):
+        __slots__ = ()
+
+
+# (symbol, count) pairs of the symbols seen in a frequency table, in symbol order
+def seen_counts(freqs):
+    if isinstance(freqs, frequencies.SparseFrequencyTable):
+        return list(zip(freqs.symbols, freqs.counts))
+    return [item for item in enumerate(freqs.frequencies) if item[1] > 0]
+
+
+# (symbol, sub-context) pairs of a context, None sub-contexts included for the dense lists
+def subcontext_items(ctx):
+    subctxs = ctx.subcontexts
+    if subctxs is None:
+        return []
+    return sorted(subctxs.items()) if isinstance(subctxs, dict) else list(enumerate(subctxs))
+
 
-        def __init__(self, symbols, hassubctx):
-            self.frequencies = frequencies.SimpleFrequencyTable(freqs=([0] * symbols))
-            self.subcontexts = ([None] * symbols) if hassubctx else None
+# Attribute values of an object, whether it keeps them in __dict__ or __slots__
+def attribute_values(obj):
+    if hasattr(obj, "__dict__"):
+        return list(vars(obj).values())
+    return [getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name)]
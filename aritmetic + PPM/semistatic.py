@@ -0,0 +1,148 @@
+import io
+import os
+import struct
+import sys
+import arithmeticcoding
+import frequencies
+import numpy as np
+
+# The bit I/O module is shared with the other algorithms in the parent folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bitio
+import instrumentation
+
+# Semi-static arithmetic coding: the symbol frequencies of the whole block are counted up front,
+# stored in the header and used unchanged for every symbol, so there is no model to update.
+# Order 0 uses a single table, order 1 one table per preceding byte (the first byte follows a 0).
+
+# Header: magic, order, original length. Order 1 then has a 32-byte bitmap of the tables present.
+# Each table is its number of symbols followed by (symbol, frequency) pairs.
+SEMISTATIC_MAGIC = b"SAC1"
+SEMISTATIC_HEADER = struct.Struct(">4sBQ")
+TABLE_SIZE = struct.Struct(">H")
+TABLE_ENTRY = struct.Struct(">BH")
+
+# Frequencies are scaled down when a table's total exceeds this, every seen symbol keeps at least 1
+MAX_FREQUENCY_TOTAL = (1 << 16) - 1
+
+
+# Counts the symbols in one bincount pass, one row per context
+def count_frequencies(symbols, order):
+    if order == 0:
+        return np.bincount(symbols, minlength=256).reshape(1, 256)
+    previous = np.concatenate((np.zeros(1, dtype=np.int64), symbols[:-1].astype(np.int64)))
+    return np.bincount(previous * 256 + symbols, minlength=256 * 256).reshape(256, 256)
+
+
+def quantize_frequencies(counts):
+    totals = counts.sum(axis=1, keepdims=True)
+    scaled = counts * MAX_FREQUENCY_TOTAL // np.maximum(totals, 1)
+    scaled = np.where(counts > 0, np.maximum(scaled, 1), 0)
+    return np.where(totals > MAX_FREQUENCY_TOTAL, scaled, counts)
+
+
+def write_table(row, out):
+    seen = np.flatnonzero(row)
+    out += TABLE_SIZE.pack(len(seen))
+    for symbol in seen:
+        out += TABLE_ENTRY.pack(symbol, row[symbol])
+
+
+# Returns the frequency table stored at offset and the offset just after it
+def read_table(byte_data, offset):
+    (num_symbols,) = TABLE_SIZE.unpack_from(byte_data, offset)
+    offset += TABLE_SIZE.size
+    end = offset + num_symbols * TABLE_ENTRY.size
+    freqs = [0] * 256
+    for symbol, freq in TABLE_ENTRY.iter_unpack(byte_data[offset:end]):
+        freqs[symbol] = freq
+    return frequencies.SimpleFrequencyTable(freqs), end
+
+
+def semistatic_compress_bytes(data, order=0, stats=None):
+    if order not in (0, 1):
+        raise ValueError("Only orders 0 and 1 are supported")
+    if stats is None:
+        stats = instrumentation.NULL_STATS
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    with stats.timer("count"):
+        counts = quantize_frequencies(count_frequencies(symbols, order))
+
+    out = io.BytesIO()
+    out.write(SEMISTATIC_HEADER.pack(SEMISTATIC_MAGIC, order, len(symbols)))
+    header = bytearray()
+    if order == 1:
+        present = counts.any(axis=1)
+        header += np.packbits(present).tobytes()
+        contexts = np.flatnonzero(present)
+    else:
+        contexts = [0]
+    tables = [None] * 256
+    for context in contexts:
+        write_table(counts[context], header)
+        tables[context] = frequencies.SimpleFrequencyTable(counts[context].tolist())
+    out.write(header)
+    stats.set("header_bytes", SEMISTATIC_HEADER.size + len(header))
+
+    bit_file = bitio.BitWriter(out)
+    counting = stats is not instrumentation.NULL_STATS
+    encode = (arithmeticcoding.CountingArithmeticEncoder if counting else arithmeticcoding.ArithmeticEncoder)(
+        32, bit_file)
+    write = encode.write
+    with stats.timer("code"):
+        if order == 0:
+            table = tables[0]
+            for symbol in bytes(data):
+                write(table, symbol)
+        else:
+            previous = 0
+            for symbol in bytes(data):
+                write(tables[previous], symbol)
+                previous = symbol
+        encode.finish()
+    if counting:
+        stats.count("underflows", encode.underflows)
+    bit_file.align()
+    bit_file.flush()
+    return out.getvalue()
+
+
+def semistatic_decompress_bytes(byte_data):
+    magic, order, length = SEMISTATIC_HEADER.unpack_from(byte_data, 0)
+    if magic != SEMISTATIC_MAGIC:
+        raise ValueError("Not a semi-static arithmetic coded stream")
+    offset = SEMISTATIC_HEADER.size
+
+    tables = [None] * 256
+    if order == 1:
+        contexts = np.flatnonzero(np.unpackbits(np.frombuffer(byte_data, dtype=np.uint8, count=32, offset=offset)))
+        offset += 32
+    else:
+        contexts = [0]
+    for context in contexts:
+        tables[context], offset = read_table(byte_data, offset)
+
+    decode = arithmeticcoding.ArithmeticDecoder(32, bitio.BitReader(io.BytesIO(bytes(byte_data[offset:]))))
+    read = decode.read
+    out = bytearray(length)
+    previous = 0
+    for index in range(length):
+        symbol = read(tables[previous])
+        out[index] = symbol
+        if order == 1:
+            previous = symbol
+    return bytes(out)
+
+
+def semistatic_compress_file(input_file, output_file, order=0):
+    with open(input_file, 'rb') as file:
+        data = file.read()
+    with open(output_file, 'wb') as file:
+        file.write(semistatic_compress_bytes(data, order))
+
+
+def semistatic_decompress_file(compressed_file, decompressed_file):
+    with open(compressed_file, 'rb') as file:
+        byte_data = file.read()
+    with open(decompressed_file, 'wb') as file:
+        file.write(semistatic_decompress_bytes(byte_data))
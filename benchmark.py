@@ -0,0 +1,244 @@
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import codec
+
+# Offline benchmark of every codec on generated corpora. The corpora only depend on their
+# seed, so runs on different machines or revisions compress exactly the same data.
+
+WORDS = ("the of and to in a is that for it as was with be by on not he this are or his from at which "
+         "but have an they you were her she there been one all we their has would when if so no what "
+         "time people year way day man thing woman life child world school state family student group "
+         "country problem hand part place case week company system program question work government "
+         "number night point home water room mother area money story fact month lot right study book").split()
+LOG_LEVELS = ("INFO", "INFO", "INFO", "DEBUG", "WARNING", "ERROR")
+LOG_PATHS = ("/api/users", "/api/orders", "/static/app.js", "/login", "/api/search", "/health")
+
+
+# English-like text: words drawn with a skewed distribution, grouped in sentences and lines
+def generate_text(size, rng):
+    weights = [1.0 / (rank + 1) for rank in range(len(WORDS))]
+    out = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choices(WORDS, weights, k=rng.randint(4, 18)))
+        sentence = sentence[0].upper() + sentence[1:] + (".\n" if rng.random() < 0.2 else ". ")
+        out.append(sentence)
+        length += len(sentence)
+    return "".join(out).encode()[:size]
+
+
+# Web server like log lines
+def generate_logs(size, rng):
+    out = []
+    length = 0
+    timestamp = 1700000000
+    while length < size:
+        timestamp += rng.randint(0, 3)
+        line = "%d %s 10.0.%d.%d GET %s %d %dms\n" % (
+            timestamp, rng.choice(LOG_LEVELS), rng.randint(0, 3), rng.randint(1, 254), rng.choice(LOG_PATHS),
+            rng.choice((200, 200, 200, 304, 404, 500)), rng.randint(1, 900))
+        out.append(line)
+        length += len(line)
+    return "".join(out).encode()[:size]
+
+
+# Long runs of a few byte values with an occasional different pattern
+def generate_repetitive(size, rng):
+    out = bytearray()
+    while len(out) < size:
+        if rng.random() < 0.1:
+            out += b"ABCD" * rng.randint(1, 50)
+        else:
+            out += bytes((rng.choice(b" \x00-=x"),)) * rng.randint(1, 500)
+    return bytes(out[:size])
+
+
+def generate_random(size, rng):
+    return rng.randbytes(size)
+
+
+CORPORA = {"text": generate_text, "logs": generate_logs, "repetitive": generate_repetitive,
+           "random": generate_random}
+
+
+def generate_corpus(name, size, seed=0):
+    return CORPORA[name](size, random.Random("%s-%d-%d" % (name, size, seed)))
+
+
+# Returns (best elapsed seconds over the repeats, result of the last call)
+def time_call(function, argument, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# Peak memory allocated by Python during a single call, measured apart from the timing
+def peak_memory(function, argument):
+    tracemalloc.start()
+    try:
+        function(argument)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def megabytes_per_second(size, seconds):
+    return size / (1 << 20) / seconds if seconds > 0 else float("inf")
+
+
+# Pipe-like input: not seekable, and sized reads may come back short as on stdin
+class PipeReader:
+
+    def __init__(self, data, read_size=1 << 14):
+        self.stream = io.BytesIO(data)
+        self.read_size = read_size
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self.stream.read()
+        return self.stream.read(min(size, self.read_size))
+
+
+# What the command line writes from a pipe must decode with the bytes API, and the other way round.
+# Returns a description of the first mismatch, None when both directions round-trip.
+def check_stream_round_trip(selected, data):
+    out = io.BytesIO()
+    selected.compress_stream(PipeReader(data), out)
+    if selected.decompress(out.getvalue()) != data:
+        return "bytes decompression does not read the stream output"
+    out = io.BytesIO()
+    selected.decompress_stream(io.BytesIO(selected.compress(data)), out)
+    if out.getvalue() != data:
+        return "stream decompression does not read the bytes output"
+    return None
+
+
+def benchmark_codec(name, corpus, size, data, repeat, measure_memory, verify=False):
+    selected = codec.get_codec(name)
+    selected.compress(data[:1024])  # Imports the codec's module outside of the measurement
+    compress_time, compressed = time_call(selected.compress, data, repeat)
+    decompress_time, decompressed = time_call(selected.decompress, compressed, repeat)
+    if decompressed != data:
+        raise RuntimeError("%s does not round-trip the %s corpus" % (name, corpus))
+
+    result = {"codec": name, "corpus": corpus, "size": size, "compressed_size": len(compressed),
+              "ratio": len(compressed) / size if size else 0.0,
+              "compress_mb_s": megabytes_per_second(size, compress_time),
+              "decompress_mb_s": megabytes_per_second(size, decompress_time)}
+    if measure_memory:
+        result["compress_peak_bytes"] = peak_memory(selected.compress, data)
+        result["decompress_peak_bytes"] = peak_memory(selected.decompress, compressed)
+    if verify:
+        result["stream_mismatch"] = check_stream_round_trip(selected, data)
+    return result
+
+
+def run_benchmarks(codecs, corpora, sizes, repeat=3, seed=0, measure_memory=True, progress=None, verify=False):
+    results = []
+    for corpus in corpora:
+        for size in sizes:
+            data = generate_corpus(corpus, size, seed)
+            for name in codecs:
+                result = benchmark_codec(name, corpus, size, data, repeat, measure_memory, verify)
+                if progress is not None:
+                    progress(result)
+                results.append(result)
+    return results
+
+
+# Peak resident set size of this process in bytes, None where the resource module is missing
+def max_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# Compares results with a baseline report. A throughput drop beyond the tolerance or any
+# growth of the compressed size is reported as a regression.
+def compare_with_baseline(results, baseline, tolerance):
+    previous = {(entry["codec"], entry["corpus"], entry["size"]): entry for entry in baseline["results"]}
+    comparison = []
+    for result in results:
+        old = previous.get((result["codec"], result["corpus"], result["size"]))
+        if old is None:
+            continue
+        entry = {"codec": result["codec"], "corpus": result["corpus"], "size": result["size"], "regressions": []}
+        for key in ("compress_mb_s", "decompress_mb_s"):
+            entry[key + "_change"] = result[key] / old[key] - 1 if old[key] else 0.0
+            if entry[key + "_change"] < -tolerance:
+                entry["regressions"].append(key)
+        entry["compressed_size_change"] = result["compressed_size"] - old["compressed_size"]
+        if entry["compressed_size_change"] > 0:
+            entry["regressions"].append("compressed_size")
+        comparison.append(entry)
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the codecs on generated corpora.")
+    parser.add_argument("--codecs", default=",".join(codec.CODECS), help="comma separated codec names")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help="comma separated corpus names")
+    parser.add_argument("--sizes", default="65536,262144", help="comma separated corpus sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per measurement, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak measurements")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative throughput drop allowed before reporting a regression")
+    parser.add_argument("--verify", action="store_true",
+                        help="also check that the stream and bytes paths read each other's output")
+    args = parser.parse_args(argv)
+
+    codecs = args.codecs.split(",")
+    corpora = args.corpora.split(",")
+    for name in codecs:
+        codec.get_codec(name)
+    for corpus in corpora:
+        if corpus not in CORPORA:
+            parser.error("unknown corpus %r" % corpus)
+
+    def progress(result):
+        print("%-10s %-10s %9d  ratio %.3f  compress %8.3f MB/s  decompress %8.3f MB/s" % (
+            result["codec"], result["corpus"], result["size"], result["ratio"], result["compress_mb_s"],
+            result["decompress_mb_s"]), file=sys.stderr)
+        if result.get("stream_mismatch"):
+            print("%-10s %-10s %9d  %s" % (result["codec"], result["corpus"], result["size"],
+                                           result["stream_mismatch"]), file=sys.stderr)
+
+    results = run_benchmarks(codecs, corpora, [int(size) for size in args.sizes.split(",")], args.repeat,
+                             args.seed, not args.no_memory, progress, args.verify)
+    report = {"python": platform.python_version(), "platform": platform.platform(), "seed": args.seed,
+              "max_rss_bytes": max_rss(), "results": results}
+
+    regressions = False
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["comparison"] = compare_with_baseline(results, json.load(file), args.tolerance)
+        regressions = any(entry["regressions"] for entry in report["comparison"])
+    mismatches = any(result.get("stream_mismatch") for result in results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if regressions or mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
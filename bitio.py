@@ -0,0 +1,117 @@
+# Buffered bit input and output over binary streams, shared by the bit-packed formats.
+# Bits are accumulated in an integer and moved to or from the stream in large chunks,
+# the most significant bit of every byte comes first.
+
+
+class BitWriter:
+
+    def __init__(self, stream, buffer_size=1 << 16):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        # Pending bits that do not make a full byte yet, always fewer than 8
+        self.bit_buffer = 0
+        self.bit_count = 0
+
+    # Writes a single bit (0 or 1)
+    def write_bit(self, bit):
+        self.bit_buffer = (self.bit_buffer << 1) | bit
+        self.bit_count += 1
+        if self.bit_count == 8:
+            self.buffer.append(self.bit_buffer)
+            self.bit_buffer = 0
+            self.bit_count = 0
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+
+    # Writes the count lowest bits of value, most significant first
+    def write_bits(self, value, count):
+        bit_buffer = (self.bit_buffer << count) | (value & ((1 << count) - 1))
+        bit_count = self.bit_count + count
+        if bit_count >= 8:
+            num_bytes = bit_count >> 3
+            bit_count &= 7
+            self.buffer += (bit_buffer >> bit_count).to_bytes(num_bytes, "big")
+            bit_buffer &= (1 << bit_count) - 1
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+        self.bit_buffer = bit_buffer
+        self.bit_count = bit_count
+
+    # Pads the pending bits with zeros up to the next byte boundary
+    def align(self):
+        if self.bit_count != 0:
+            self.write_bits(0, 8 - self.bit_count)
+
+    # Writes the complete bytes to the stream, pending bits stay buffered
+    def flush(self):
+        if self.buffer:
+            self.stream.write(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        self.align()
+        self.flush()
+        self.stream.close()
+
+
+class BitReader:
+
+    def __init__(self, stream, buffer_size=1 << 16):
+        self.stream = stream
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.length = 0     # Number of valid bytes in buffer
+        self.position = 0   # Next byte of buffer to consume
+        # Bits taken from the buffer but not returned yet
+        self.bit_buffer = 0
+        self.bit_count = 0
+
+    # Refills the buffer from the stream, returns False once the stream is exhausted
+    def _fill(self):
+        if hasattr(self.stream, "readinto"):
+            self.length = self.stream.readinto(self.view) or 0
+        else:
+            chunk = self.stream.read(len(self.buffer))
+            self.length = len(chunk)
+            self.view[:self.length] = chunk
+        self.position = 0
+        return self.length > 0
+
+    # Reads a bit, returns 0 or 1, or -1 when the end of the stream is reached.
+    # The end of stream always occurs on a byte boundary.
+    def read_bit(self):
+        if self.bit_count == 0:
+            if self.position >= self.length and not self._fill():
+                return -1
+            self.bit_buffer = self.buffer[self.position]
+            self.position += 1
+            self.bit_count = 8
+        self.bit_count -= 1
+        return (self.bit_buffer >> self.bit_count) & 1
+
+    # Reads count bits as an unsigned integer, most significant first.
+    # Raises EOFError when the stream ends before count bits are available.
+    def read_bits(self, count):
+        bit_count = self.bit_count
+        bit_buffer = self.bit_buffer & ((1 << bit_count) - 1)  # read_bit leaves consumed bits above
+        while bit_count < count:
+            if self.position >= self.length and not self._fill():
+                raise EOFError("End of bit stream")
+            num_bytes = min((count - bit_count + 7) >> 3, self.length - self.position)
+            end = self.position + num_bytes
+            bit_buffer = (bit_buffer << (8 * num_bytes)) | int.from_bytes(self.view[self.position:end], "big")
+            self.position = end
+            bit_count += 8 * num_bytes
+        bit_count -= count
+        self.bit_buffer = bit_buffer & ((1 << bit_count) - 1)
+        self.bit_count = bit_count
+        return bit_buffer >> bit_count
+
+    # Drops the bits left in the current byte
+    def align(self):
+        self.bit_buffer = 0
+        self.bit_count = 0
+
+    def close(self):
+        self.stream.close()
@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import struct
+
+# Block helpers shared by the block containers. The Huffman and PPM block containers put one
+# (original length, compressed length) entry per block after their own header, then the blocks.
+BLOCK_ENTRY = struct.Struct(">QQ")
+
+
+def split_blocks(data, block_size):
+    return [bytes(data[i:i + block_size]) for i in range(0, len(data), block_size)]
+
+
+# Process pool for the blocks, None when they are processed inline (one worker or one block)
+@contextlib.contextmanager
+def block_pool(workers, num_blocks):
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be at least 1")
+    if workers == 1 or num_blocks <= 1:
+        yield None
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield pool
+
+
+def map_blocks(function, items, pool):
+    if pool is None:
+        return list(map(function, items))
+    return list(pool.map(function, items))
+
+
+# Runs function over the blocks in a pool of workers, or inline when a single worker is asked for
+def run_blocks(function, blocks, workers):
+    with block_pool(workers, len(blocks)) as pool:
+        return map_blocks(function, blocks, pool)
+
+
+# Appends the index entries and then the compressed blocks to out, which already holds the header
+def write_block_index(out, blocks, compressed_blocks):
+    for block, compressed_block in zip(blocks, compressed_blocks):
+        out += BLOCK_ENTRY.pack(len(block), len(compressed_block))
+    for compressed_block in compressed_blocks:
+        out += compressed_block
+
+
+# Returns a list of (offset, compressed length, original length), one per block, for an index
+# of num_blocks entries starting at entry_offset
+def read_block_index(byte_data, entry_offset, num_blocks):
+    offset = entry_offset + num_blocks * BLOCK_ENTRY.size
+    block_index = []
+    for _ in range(num_blocks):
+        original_length, compressed_length = BLOCK_ENTRY.unpack_from(byte_data, entry_offset)
+        block_index.append((offset, compressed_length, original_length))
+        entry_offset += BLOCK_ENTRY.size
+        offset += compressed_length
+    if offset > len(byte_data):
+        raise ValueError("Truncated block container")
+    return block_index
@@ -0,0 +1,184 @@
+import argparse
+import importlib
+import os
+import sys
+
+# Common interface over the compression algorithms of this project. A codec's module is only
+# imported the first time the codec is used, so picking one codec does not load the others
+# (or numpy, which some of them need).
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Codec:
+
+    # module_name and the function names refer to the module implementing the algorithm, folder
+    # is the sub-folder holding it. blocks is (compress function, decompress function, magic) for
+    # codecs with a block container, streams is (compress function, decompress function) for
+    # codecs that can work on streams without reading the whole input.
+    def __init__(self, name, module_name, compress_name, decompress_name, folder=None, blocks=None,
+                 streams=None):
+        self.name = name
+        self.module_name = module_name
+        self.compress_name = compress_name
+        self.decompress_name = decompress_name
+        self.folder = folder
+        self.blocks = blocks
+        self.streams = streams
+        self.module = None
+
+    def _function(self, function_name):
+        if self.module is None:
+            if self.folder is not None:
+                folder = os.path.join(PROJECT_DIR, self.folder)
+                if folder not in sys.path:
+                    sys.path.insert(0, folder)
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, function_name)
+
+    # With a block size the input is split into blocks compressed in a pool of workers processes.
+    # stats, an instrumentation.Stats, collects the codec's statistics (not for blocks).
+    def compress(self, data, block_size=None, workers=None, stats=None):
+        if block_size is None:
+            return self._function(self.compress_name)(data, stats=stats)
+        if self.blocks is None:
+            raise ValueError("The %s codec does not support blocks" % self.name)
+        return self._function(self.blocks[0])(data, block_size, workers)
+
+    def decompress(self, byte_data, workers=None):
+        if self.blocks is not None and byte_data[:4] == self.blocks[2]:
+            return self._function(self.blocks[1])(byte_data, workers)
+        return self._function(self.decompress_name)(byte_data)
+
+    def compress_stream(self, inp, out, block_size=None, workers=None):
+        if self.streams is not None and block_size is None:
+            self._function(self.streams[0])(inp, out)
+        else:
+            out.write(self.compress(inp.read(), block_size, workers))
+
+    def decompress_stream(self, inp, out, workers=None):
+        if self.streams is not None:
+            # The stream function cannot tell a block container apart, look at the magic first
+            inp = BufferedPeek(inp)
+            if self.blocks is None or inp.peek(4) != self.blocks[2]:
+                self._function(self.streams[1])(inp, out)
+                return
+        out.write(self.decompress(inp.read(), workers))
+
+    def compress_file(self, input_file, output_file, block_size=None, workers=None):
+        with open(input_file, 'rb') as inp, open(output_file, 'wb') as out:
+            self.compress_stream(inp, out, block_size, workers)
+
+    def decompress_file(self, compressed_file, decompressed_file, workers=None):
+        with open(compressed_file, 'rb') as inp, open(decompressed_file, 'wb') as out:
+            self.decompress_stream(inp, out, workers)
+
+
+# Stream wrapper that can look at the first bytes without consuming them
+class BufferedPeek:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = b""
+
+    def peek(self, size):
+        if len(self.pending) < size:
+            self.pending += self.stream.read(size - len(self.pending))
+        return self.pending[:size]
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self.pending + self.stream.read()
+            self.pending = b""
+            return data
+        data = self.pending[:size]
+        self.pending = self.pending[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+CODECS = {
+    "huffman": Codec("huffman", "Huffman", "huffman_compress_numpy", "huffman_decompress_bytes",
+                     blocks=("huffman_compress_blocks", "huffman_decompress_blocks", b"HUFB"),
+                     streams=("huffman_compress_stream", "huffman_decompress_stream")),
+    "lzw": Codec("lzw", "LZW", "lzw_compress_bytes", "lzw_decompress_bytes"),
+    "rle": Codec("rle", "RLE", "rle_compress_bytes", "rle_decompress_bytes"),
+    "ppm": Codec("ppm", "main", "compress_bytes", "decompress_bytes", folder="aritmetic + PPM",
+                 blocks=("compress_blocks", "decompress_blocks", b"PPMB")),
+    "semistatic": Codec("semistatic", "semistatic", "semistatic_compress_bytes", "semistatic_decompress_bytes",
+                        folder="aritmetic + PPM"),
+}
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError("Unknown codec %r, expected one of: %s" % (name, ", ".join(CODECS)))
+    return CODECS[name]
+
+
+def compress(name, data, block_size=None, workers=None, stats=None):
+    return get_codec(name).compress(data, block_size, workers, stats)
+
+
+def decompress(name, byte_data, workers=None):
+    return get_codec(name).decompress(byte_data, workers)
+
+
+def compress_file(name, input_file, output_file, block_size=None, workers=None):
+    get_codec(name).compress_file(input_file, output_file, block_size, workers)
+
+
+def decompress_file(name, compressed_file, decompressed_file, workers=None):
+    get_codec(name).decompress_file(compressed_file, decompressed_file, workers)
+
+
+# Command line: codec.py compress|decompress CODEC INPUT OUTPUT, "-" reads stdin or writes stdout
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress or decompress files with the project's codecs.")
+    parser.add_argument("mode", choices=("compress", "decompress"))
+    parser.add_argument("codec", choices=sorted(CODECS) + ["auto"], help="auto picks a codec per block (--framed)")
+    parser.add_argument("input", help="input path, - for stdin")
+    parser.add_argument("output", help="output path, - for stdout")
+    parser.add_argument("--block-size", type=int, default=None,
+                        help="split the input into blocks of this many bytes (huffman and ppm)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes for blocks, defaults to the number of CPUs")
+    parser.add_argument("--framed", action="store_true",
+                        help="use the framed container (checksums, block index, random access), any codec")
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if args.framed:
+        if "-" in (args.input, args.output):
+            parser.error("--framed works on files only")
+        import container
+        if args.mode == "compress":
+            container.compress_file(args.input, args.output, args.codec,
+                                    args.block_size or container.DEFAULT_BLOCK_SIZE, args.workers)
+        else:
+            container.decompress_file(args.input, args.output, args.workers)
+        return
+    if args.codec == "auto":
+        parser.error("auto needs --framed, which records the codec of every block")
+
+    codec = get_codec(args.codec)
+    if args.block_size is not None and codec.blocks is None:
+        parser.error("the %s codec does not support --block-size" % codec.name)
+    inp = sys.stdin.buffer if args.input == "-" else open(args.input, 'rb')
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, 'wb')
+    try:
+        if args.mode == "compress":
+            codec.compress_stream(inp, out, args.block_size, args.workers)
+        else:
+            codec.decompress_stream(inp, out, args.workers)
+    finally:
+        if inp is not sys.stdin.buffer:
+            inp.close()
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import bisect
+import blockio
+import functools
+import io
+import os
+import struct
+import zlib
+import codec
+
+# Framed container shared by all codecs: a header, independently compressed blocks, then an
+# index of the blocks and a fixed-size footer pointing at it. A reader seeks to the footer,
+# loads the index and decompresses only the blocks covering the bytes it needs.
+
+# Header: magic, format version, nominal block size
+CONTAINER_MAGIC = b"ITFC"
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = struct.Struct(">4sBQ")
+# Index entry per block: codec id, offset and size of the compressed block, original size,
+# CRC32 of the compressed block and CRC32 of the original data
+INDEX_ENTRY = struct.Struct(">BQQQII")
+# Footer: offset of the index, number of blocks, magic
+CONTAINER_FOOTER = struct.Struct(">QQ4s")
+INDEX_MAGIC = b"ITFX"
+
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+# Codec ids stored in the index. "raw" blocks are stored uncompressed.
+CODEC_IDS = {"raw": 0, "huffman": 1, "lzw": 2, "rle": 3, "ppm": 4, "semistatic": 5}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+
+# "auto" picks the codec of every block from statistics of a sample of it. Each codec's expected
+# ratio is estimated and charged its CPU cost (about the seconds per MB it takes to compress here)
+# times cost_weight; the lowest total wins. cost_weight 0 asks for the best ratio at any cost.
+AUTO_COST_WEIGHT = 0.02
+AUTO_SAMPLE_SIZE = 1 << 16
+CODEC_COSTS = {"raw": 0.0, "rle": 0.07, "huffman": 0.1, "lzw": 0.7, "ppm": 8.0}
+
+
+# Order-0 entropy in bits per byte, runs per byte and the share of 4-byte sequences already seen
+# earlier, measured on up to sample_size bytes taken from evenly spaced parts of the block
+def block_statistics(data, sample_size=AUTO_SAMPLE_SIZE):
+    import numpy as np
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    if len(symbols) > sample_size:
+        part = sample_size // 4
+        starts = np.linspace(0, len(symbols) - part, 4).astype(np.int64)
+        symbols = np.concatenate([symbols[start:start + part] for start in starts])
+    if len(symbols) < 4:
+        return {"entropy": 8.0, "run_ratio": 1.0, "repeat_rate": 0.0}
+
+    probabilities = np.bincount(symbols, minlength=256) / len(symbols)
+    probabilities = probabilities[probabilities > 0]
+    entropy = float(-(probabilities * np.log2(probabilities)).sum())
+    run_ratio = (1 + np.count_nonzero(np.diff(symbols))) / len(symbols)
+    wide = symbols.astype(np.uint32)
+    grams = wide[:-3] | (wide[1:-2] << 8) | (wide[2:-1] << 16) | (wide[3:] << 24)
+    repeat_rate = 1 - len(np.unique(grams)) / len(grams)
+    return {"entropy": entropy, "run_ratio": run_ratio, "repeat_rate": repeat_rate}
+
+
+# Expected compressed size / original size of each codec. RLE stores about 2 bytes per run,
+# Huffman gets close to the order-0 entropy, LZW and PPM gain with the repeated sequences
+# (fitted on generated text, logs, repetitive and random data).
+def estimate_ratios(statistics):
+    new_grams = 1 - statistics["repeat_rate"]
+    lzw = 1.4 * new_grams ** 0.5
+    return {"raw": 1.0,
+            "rle": 2 * statistics["run_ratio"],
+            "huffman": statistics["entropy"] / 8 + 0.01,
+            "lzw": lzw,
+            "ppm": lzw * (0.7 if new_grams < 0.5 else 1.1)}
+
+
+def choose_codec(data, cost_weight=AUTO_COST_WEIGHT, sample_size=AUTO_SAMPLE_SIZE):
+    ratios = estimate_ratios(block_statistics(data, sample_size))
+    return min(ratios, key=lambda name: ratios[name] + cost_weight * CODEC_COSTS[name])
+
+
+# Returns the codec actually used and the compressed block. With "auto" a block that would
+# not shrink is stored raw.
+def compress_block(codec_name, data, cost_weight=AUTO_COST_WEIGHT):
+    if codec_name == "auto":
+        codec_name = choose_codec(data, cost_weight)
+        if codec_name != "raw":
+            payload = codec.compress(codec_name, data)
+            if len(payload) < len(data):
+                return codec_name, payload
+        return "raw", bytes(data)
+    if codec_name == "raw":
+        return codec_name, bytes(data)
+    return codec_name, codec.compress(codec_name, data)
+
+
+def decompress_block(codec_name, payload):
+    if codec_name == "raw":
+        return bytes(payload)
+    return codec.decompress(codec_name, payload)
+
+
+class ContainerWriter:
+
+    # Blocks are written to stream as they are completed, finish writes the index. The stream
+    # only has to support write. codec_name can be "auto", see choose_codec.
+    def __init__(self, stream, codec_name="huffman", block_size=DEFAULT_BLOCK_SIZE, cost_weight=AUTO_COST_WEIGHT):
+        if codec_name not in CODEC_IDS and codec_name != "auto":
+            raise ValueError("Unknown codec %r" % codec_name)
+        self.stream = stream
+        self.codec_name = codec_name
+        self.block_size = block_size
+        self.cost_weight = cost_weight
+        self.pending = bytearray()
+        self.index = bytearray()
+        self.num_blocks = 0
+        self.stream.write(CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, block_size))
+        self.offset = CONTAINER_HEADER.size
+
+    # Buffers data and compresses every full block with the writer's codec
+    def write(self, data):
+        self.pending += data
+        while len(self.pending) >= self.block_size:
+            self._compress_block(bytes(self.pending[:self.block_size]), self.codec_name)
+            del self.pending[:self.block_size]
+
+    # Compresses data as one block, with the given codec or the writer's one. Data buffered by
+    # write goes first, as a shorter block.
+    def write_block(self, data, codec_name=None):
+        self.flush()
+        self._compress_block(data, codec_name or self.codec_name)
+
+    def _compress_block(self, data, codec_name):
+        self.write_compressed_block(*compress_block(codec_name, data, self.cost_weight), data)
+
+    # Compresses the data buffered by write as a block, even when it is shorter than block_size
+    def flush(self):
+        if self.pending:
+            self._compress_block(bytes(self.pending), self.codec_name)
+            self.pending = bytearray()
+
+    # Adds a block compressed elsewhere (e.g. in a worker process), data is its original content.
+    # Unlike write_block it does not flush the data buffered by write.
+    def write_compressed_block(self, codec_name, payload, data):
+        self.index += INDEX_ENTRY.pack(CODEC_IDS[codec_name], self.offset, len(payload), len(data),
+                                       zlib.crc32(payload), zlib.crc32(data))
+        self.stream.write(payload)
+        self.offset += len(payload)
+        self.num_blocks += 1
+
+    # Compresses the buffered rest as a last, shorter block and writes the index and the footer,
+    # the stream is left open
+    def finish(self):
+        self.flush()
+        self.stream.write(self.index)
+        self.stream.write(CONTAINER_FOOTER.pack(self.offset, self.num_blocks, INDEX_MAGIC))
+
+
+class ContainerReader:
+
+    # stream must be seekable, only the header, the footer and the index are read up front
+    def __init__(self, stream):
+        self.stream = stream
+        stream.seek(0)
+        magic, version, self.block_size = CONTAINER_HEADER.unpack(stream.read(CONTAINER_HEADER.size))
+        if magic != CONTAINER_MAGIC:
+            raise ValueError("Not a framed container")
+        if version != CONTAINER_VERSION:
+            raise ValueError("Unsupported container version %d" % version)
+
+        stream.seek(-CONTAINER_FOOTER.size, os.SEEK_END)
+        index_offset, num_blocks, index_magic = CONTAINER_FOOTER.unpack(stream.read(CONTAINER_FOOTER.size))
+        if index_magic != INDEX_MAGIC:
+            raise ValueError("Container index is missing or truncated")
+        stream.seek(index_offset)
+        index = stream.read(num_blocks * INDEX_ENTRY.size)
+
+        # (codec name, offset, compressed size, original size, compressed CRC32, CRC32) per block,
+        # and the position of every block in the original data
+        self.blocks = []
+        self.starts = []
+        self.length = 0
+        for codec_id, offset, size, original_size, payload_crc, crc in INDEX_ENTRY.iter_unpack(index):
+            self.blocks.append((CODEC_NAMES[codec_id], offset, size, original_size, payload_crc, crc))
+            self.starts.append(self.length)
+            self.length += original_size
+
+    def __len__(self):
+        return len(self.blocks)
+
+    # Returns the codec name and the compressed bytes of a block, checked against its CRC32
+    def read_compressed_block(self, number):
+        codec_name, offset, size, _, payload_crc, _ = self.blocks[number]
+        self.stream.seek(offset)
+        payload = self.stream.read(size)
+        if len(payload) != size or zlib.crc32(payload) != payload_crc:
+            raise ValueError("Block %d is corrupted" % number)
+        return codec_name, payload
+
+    def read_block(self, number):
+        return check_block(self.blocks[number], decompress_block(*self.read_compressed_block(number)), number)
+
+    # Returns length bytes of the original data starting at offset (up to the end without a
+    # length), decompressing only the blocks that hold them
+    def read(self, offset=0, length=None):
+        end = self.length if length is None else min(self.length, offset + length)
+        if offset >= end:
+            return b""
+        out = bytearray()
+        number = bisect.bisect_right(self.starts, offset) - 1
+        while number < len(self.blocks) and self.starts[number] < end:
+            block = self.read_block(number)
+            start = self.starts[number]
+            out += block[max(offset - start, 0):end - start]
+            number += 1
+        return bytes(out)
+
+
+# Verifies a decompressed block against its index entry and returns it
+def check_block(entry, data, number):
+    if len(data) != entry[3] or zlib.crc32(data) != entry[5]:
+        raise ValueError("Block %d does not match its checksum" % number)
+    return data
+
+
+def decompress_entry(entry_and_payload):
+    (codec_name, payload), number, entry = entry_and_payload
+    return check_block(entry, decompress_block(codec_name, payload), number)
+
+
+def compress_bytes(data, codec_name="huffman", block_size=DEFAULT_BLOCK_SIZE, workers=None,
+                   cost_weight=AUTO_COST_WEIGHT):
+    out = io.BytesIO()
+    writer = ContainerWriter(out, codec_name, block_size, cost_weight)
+    blocks = blockio.split_blocks(data, block_size)
+    results = blockio.run_blocks(functools.partial(compress_block, codec_name, cost_weight=cost_weight), blocks, workers)
+    for block, (block_codec, payload) in zip(blocks, results):
+        writer.write_compressed_block(block_codec, payload, block)
+    writer.finish()
+    return out.getvalue()
+
+
+def decompress_bytes(byte_data, workers=None):
+    reader = ContainerReader(io.BytesIO(byte_data))
+    items = [(reader.read_compressed_block(number), number, reader.blocks[number]) for number in range(len(reader))]
+    return b"".join(blockio.run_blocks(decompress_entry, items, workers))
+
+
+# The input is read a batch of blocks at a time, one block per worker, so memory stays bounded
+def compress_file(input_file, output_file, codec_name="huffman", block_size=DEFAULT_BLOCK_SIZE, workers=None,
+                  cost_weight=AUTO_COST_WEIGHT):
+    batch = workers or os.cpu_count() or 1
+    with open(input_file, 'rb') as inp, open(output_file, 'wb') as out, blockio.block_pool(workers, batch) as pool:
+        writer = ContainerWriter(out, codec_name, block_size, cost_weight)
+        while True:
+            blocks = [block for block in (inp.read(block_size) for _ in range(batch)) if block]
+            results = blockio.map_blocks(functools.partial(compress_block, codec_name, cost_weight=cost_weight),
+                                         blocks, pool)
+            for block, (block_codec, payload) in zip(blocks, results):
+                writer.write_compressed_block(block_codec, payload, block)
+            if len(blocks) < batch:
+                break
+        writer.finish()
+
+
+def decompress_file(compressed_file, decompressed_file, workers=None):
+    batch = workers or os.cpu_count() or 1
+    with open(compressed_file, 'rb') as inp, open(decompressed_file, 'wb') as out:
+        reader = ContainerReader(inp)
+        with blockio.block_pool(workers, min(batch, len(reader))) as pool:
+            for first in range(0, len(reader), batch):
+                numbers = range(first, min(first + batch, len(reader)))
+                items = [(reader.read_compressed_block(number), number, reader.blocks[number]) for number in numbers]
+                for block in blockio.map_blocks(decompress_entry, items, pool):
+                    out.write(block)
+
+
+# Random access: length bytes of the original data at offset, read from a container file
+def read_range(compressed_file, offset, length):
+    with open(compressed_file, 'rb') as inp:
+        return ContainerReader(inp).read(offset, length)
@@ -0,0 +1,85 @@
+import contextlib
+import os
+import signal
+import time
+
+# Opt-in statistics for the codecs. The compress functions take stats=None; given a Stats object
+# they fill it with counters, values, series and per-stage timings. Without one they use
+# NULL_STATS, whose methods do nothing. Anything costing more than such a call, a histogram or a
+# counter in a per-symbol loop, is only computed when a Stats object is given (the PPM and
+# semi-static coders then switch to arithmeticcoding.CountingArithmeticEncoder), so disabled
+# statistics cost a few calls per block.
+
+
+class Stats:
+
+    def __init__(self):
+        self.counters = {}  # Event counts
+        self.values = {}    # Single measurements, e.g. a histogram or a final size
+        self.series = {}    # Measurements taken repeatedly during a run
+        self.timings = {}   # Seconds spent per stage
+        self.samples = {}   # Profiler samples per "file:function"
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def append(self, name, value):
+        self.series.setdefault(name, []).append(value)
+
+    # Adds the time spent in the with block to the named stage
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    # Samples the running function every interval seconds of CPU time (main thread, Unix only)
+    @contextlib.contextmanager
+    def sampling(self, interval=0.001):
+        if not hasattr(signal, "setitimer"):
+            raise RuntimeError("Sampling needs signal.setitimer, which this platform does not have")
+
+        def sample(signum, frame):
+            if frame is not None:
+                key = "%s:%s" % (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+        previous_handler = signal.signal(signal.SIGPROF, sample)
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        try:
+            yield
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous_handler)
+
+    def as_dict(self):
+        return {"counters": dict(self.counters), "values": dict(self.values),
+                "series": {name: list(values) for name, values in self.series.items()},
+                "timings": dict(self.timings), "samples": dict(self.samples)}
+
+
+# Stand-in used when statistics are disabled, every method does nothing
+class NullStats:
+
+    def count(self, name, amount=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def append(self, name, value):
+        pass
+
+    def timer(self, name):
+        return contextlib.nullcontext()
+
+    def sampling(self, interval=0.001):
+        return contextlib.nullcontext()
+
+
+NULL_STATS = NullStats()